@@ -0,0 +1,105 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+
+def token_cache_key(key):
+    return 'auth:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+class LocalTokenCache:
+    """LRU токенов в памяти процесса с ограниченным временем жизни."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.entries.pop(key, None)
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, user):
+        with self.lock:
+            self.entries[key] = (
+                time.monotonic() + settings.TOKEN_CACHE_LOCAL_TTL, user)
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.TOKEN_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def discard(self, key=None, user_id=None):
+        with self.lock:
+            for cached_key, (_, user) in list(self.entries.items()):
+                if cached_key == key or user.pk == user_id:
+                    del self.entries[cached_key]
+
+
+local_tokens = LocalTokenCache()
+
+
+def forget_token(key):
+    """Сбрасывает кэш токена после фиксации транзакции.
+
+    До фиксации параллельный запрос прочитал бы из базы старую строку
+    и вернул бы её в кэш на TOKEN_CACHE_TTL.
+    """
+    def forget():
+        local_tokens.discard(key=key)
+        cache.delete(token_cache_key(key))
+    transaction.on_commit(forget)
+
+
+def forget_user(user_id):
+    def forget():
+        local_tokens.discard(user_id=user_id)
+        cache.delete(user_cache_key(user_id))
+    transaction.on_commit(forget)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к базе на каждый вызов API.
+
+    Пользователь ищется в LRU процесса, затем в общем кэше. Общий кэш
+    сбрасывается сигналами при выходе, изменении или деактивации
+    пользователя, локальный живёт не дольше TOKEN_CACHE_LOCAL_TTL.
+    """
+
+    def authenticate_credentials(self, key):
+        user = local_tokens.get(key)
+        if user is None:
+            user = self.shared_user(key)
+            if user is None:
+                user, _ = super().authenticate_credentials(key)
+                cache.set_many({token_cache_key(key): user.pk,
+                                user_cache_key(user.pk): user},
+                               settings.TOKEN_CACHE_TTL)
+            local_tokens.set(key, user)
+        if not user.is_active:
+            raise AuthenticationFailed('Пользователь неактивен или удалён.')
+        # Копия, чтобы изменения в одном запросе не попали в другие потоки.
+        user = copy.copy(user)
+        return user, Token(key=key, user=user)
+
+    @staticmethod
+    def shared_user(key):
+        user_id = cache.get(token_cache_key(key))
+        if user_id is None:
+            return None
+        return cache.get(user_cache_key(user_id))
@@ -0,0 +1,56 @@
+import gzip
+
+from recipes.models import Ingredient
+from recipes.versions import cached_per_version
+from rest_framework.renderers import JSONRenderer
+
+from .serializers import IngredientSerializer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Сжатия каталога в порядке предпочтения.
+ENCODINGS = ('gzip',) if brotli is None else ('br', 'gzip')
+
+
+@cached_per_version(Ingredient)
+def get_ingredient_catalog():
+    """Полный список ингредиентов в JSON и его сжатые варианты."""
+    content = JSONRenderer().render(
+        IngredientSerializer(Ingredient.objects.all(), many=True).data)
+    catalog = {'identity': content, 'gzip': gzip.compress(content)}
+    if brotli is not None:
+        catalog['br'] = brotli.compress(content)
+    return catalog
+
+
+def parse_accept_encoding(accept_encoding):
+    """Веса q из заголовка Accept-Encoding: {кодировка: q}."""
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, *params = item.split(';')
+        weight = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name.lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if coding.strip():
+            weights[coding.strip().lower()] = weight
+    return weights
+
+
+def pick_encoding(accept_encoding):
+    """Сжатие с наибольшим весом, кодировки с q=0 клиент не принимает."""
+    weights = parse_accept_encoding(accept_encoding)
+    weight, _, encoding = max(
+        (weights.get(encoding, weights.get('*', 0.0)), -position, encoding)
+        for position, encoding in enumerate(ENCODINGS)
+    )
+    if weight > 0 and weight >= weights.get('identity', 0.0):
+        return encoding
+    return 'identity'
@@ -0,0 +1,171 @@
+import csv
+import json
+
+PDF_PAGE_WIDTH = 595
+PDF_PAGE_HEIGHT = 842
+PDF_MARGIN = 50
+PDF_FONT_SIZE = 12
+PDF_LEADING = 16
+PDF_LINES_PER_PAGE = (PDF_PAGE_HEIGHT - 2 * PDF_MARGIN) // PDF_LEADING
+PDF_ENCODING = 'cp1251'
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def ingredient_lines(ingredients):
+    yield 'Нужно купить:'
+    for ingredient in ingredients:
+        yield (f'{ingredient["ingredient__name"]} '
+               f'({ingredient["ingredient__measurement_unit"]}) - '
+               f'{ingredient["amount"]}')
+
+
+def export_txt(ingredients):
+    lines = ingredient_lines(ingredients)
+    yield next(lines)
+    for line in lines:
+        yield f'\n{line}'
+
+
+def export_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for ingredient in ingredients:
+        yield writer.writerow((ingredient['ingredient__name'],
+                               ingredient['ingredient__measurement_unit'],
+                               ingredient['amount']))
+
+
+def export_json(ingredients):
+    separator = '['
+    for ingredient in ingredients:
+        yield separator + json.dumps({
+            'name': ingredient['ingredient__name'],
+            'measurement_unit': ingredient['ingredient__measurement_unit'],
+            'amount': ingredient['amount'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield ']' if separator == ',' else '[]'
+
+
+def cyrillic_glyph_name(char):
+    """Имя глифа кириллической буквы по Adobe Glyph List."""
+    code = ord(char)
+    if char == 'Ё':
+        return 'afii10023'
+    if char == 'ё':
+        return 'afii10071'
+    if 0x410 <= code <= 0x415:
+        return f'afii{10017 + code - 0x410}'
+    if 0x416 <= code <= 0x42F:
+        return f'afii{10024 + code - 0x416}'
+    if 0x430 <= code <= 0x435:
+        return f'afii{10065 + code - 0x430}'
+    return f'afii{10072 + code - 0x436}'
+
+
+def pdf_font_encoding():
+    differences = []
+    for code in range(0xA8, 0x100):
+        char = bytes((code,)).decode(PDF_ENCODING)
+        if char in 'Ёё' or 0xC0 <= code:
+            differences.append(f'{code} /{cyrillic_glyph_name(char)}')
+    return ('<< /Type /Encoding /BaseEncoding /WinAnsiEncoding '
+            f'/Differences [{" ".join(differences)}] >>')
+
+
+def pdf_string(line):
+    data = line.encode(PDF_ENCODING, errors='replace')
+    return (b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(')
+            .replace(b')', b'\\)') + b')')
+
+
+class PDFWriter:
+    """Пишет PDF по частям, отслеживая смещения объектов для xref."""
+    CATALOG, PAGES, FONT = 1, 2, 3
+
+    def __init__(self):
+        self.offset = 0
+        self.offsets = {}
+        self.pages = []
+
+    def emit(self, data):
+        self.offset += len(data)
+        return data
+
+    def object(self, number, body):
+        self.offsets[number] = self.offset
+        return self.emit(f'{number} 0 obj\n'.encode() + body
+                         + b'\nendobj\n')
+
+    def next_number(self):
+        return max(self.offsets, default=self.FONT) + 1
+
+    def start(self):
+        yield self.emit(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        yield self.object(self.CATALOG, (
+            f'<< /Type /Catalog /Pages {self.PAGES} 0 R >>'.encode()))
+        yield self.object(self.FONT, (
+            '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica '
+            f'/Encoding {pdf_font_encoding()} >>').encode())
+
+    def page(self, lines):
+        content = b''.join((
+            f'BT /F1 {PDF_FONT_SIZE} Tf {PDF_LEADING} TL '
+            f'{PDF_MARGIN} {PDF_PAGE_HEIGHT - PDF_MARGIN} Td\n'.encode(),
+            b''.join(pdf_string(line) + b" '\n" for line in lines),
+            b'ET',
+        ))
+        content_number = self.next_number()
+        yield self.object(content_number, (
+            f'<< /Length {len(content)} >>\nstream\n'.encode()
+            + content + b'\nendstream'))
+        page_number = self.next_number()
+        self.pages.append(page_number)
+        yield self.object(page_number, (
+            f'<< /Type /Page /Parent {self.PAGES} 0 R '
+            f'/MediaBox [0 0 {PDF_PAGE_WIDTH} {PDF_PAGE_HEIGHT}] '
+            f'/Resources << /Font << /F1 {self.FONT} 0 R >> >> '
+            f'/Contents {content_number} 0 R >>').encode())
+
+    def finish(self):
+        kids = ' '.join(f'{number} 0 R' for number in self.pages)
+        yield self.object(self.PAGES, (
+            f'<< /Type /Pages /Kids [{kids}] '
+            f'/Count {len(self.pages)} >>').encode())
+        xref_offset = self.offset
+        size = max(self.offsets) + 1
+        yield self.emit(
+            f'xref\n0 {size}\n0000000000 65535 f \n'.encode()
+            + b''.join(
+                f'{self.offsets[number]:010d} 00000 n \n'.encode()
+                for number in range(1, size))
+            + (f'trailer\n<< /Size {size} /Root {self.CATALOG} 0 R >>\n'
+               f'startxref\n{xref_offset}\n%%EOF\n').encode())
+
+
+def export_pdf(ingredients):
+    writer = PDFWriter()
+    yield from writer.start()
+    lines = []
+    for line in ingredient_lines(ingredients):
+        lines.append(line)
+        if len(lines) == PDF_LINES_PER_PAGE:
+            yield from writer.page(lines)
+            lines = []
+    if lines:
+        yield from writer.page(lines)
+    yield from writer.finish()
+
+
+EXPORTERS = {
+    'txt': export_txt,
+    'csv': export_csv,
+    'json': export_json,
+    'pdf': export_pdf,
+}
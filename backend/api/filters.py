@@ -1,5 +1,6 @@
 from django.db.models import Q
 from django_filters.rest_framework import FilterSet, filters
+from recipes.fulltext import search_recipes
 from recipes.models import Ingredient, Recipe, Tag
 
 
@@ -23,6 +24,7 @@ class RecipeFilter(FilterSet):
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
@@ -37,3 +39,6 @@ class RecipeFilter(FilterSet):
         if value and not self.request.user.is_anonymous:
             return queryset.filter(shopping_cart__user=self.request.user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
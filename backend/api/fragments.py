@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from recipes.models import Ingredient, Tag
+from recipes.versions import get_versions, version_key
+
+# Поля, которые зависят от зрителя или меняются без сохранения рецепта;
+# они не кэшируются и берутся из уже загруженного объекта.
+OVERLAY_FIELDS = ('author', 'is_favorited', 'is_in_shopping_cart',
+                  'favorites_count', 'in_carts_count')
+
+
+def fragment_keys(recipes, request):
+    """Ключи кэша, версионированные датой изменения рецепта и версиями
+    справочников тегов и ингредиентов."""
+    tags, ingredients = get_versions([version_key(Tag),
+                                      version_key(Ingredient)])
+    # Ссылка на изображение абсолютная, поэтому схема и хост - часть ключа.
+    origin = f'{request.scheme}://{request.get_host()}' if request else ''
+    return [f'recipe:{recipe.pk}:{recipe.updated.timestamp()}:{tags}:'
+            f'{ingredients}:{origin}' for recipe in recipes]
+
+
+def render_recipes(serializer, recipes):
+    """Представления рецептов из кэша с наложенными полями зрителя.
+
+    Теги и ингредиенты подгружаются только для рецептов, которых нет в кэше.
+    """
+    keys = fragment_keys(recipes, serializer.context.get('request'))
+    fragments = cache.get_many(keys)
+    missing = [(key, recipe) for key, recipe in zip(keys, recipes)
+               if key not in fragments]
+    if missing:
+        prefetch_related_objects([recipe for _, recipe in missing],
+                                 'tags', 'recipe_ingredients__ingredient')
+        fresh = {}
+        for key, recipe in missing:
+            data = serializer.build_representation(recipe)
+            fresh[key] = {name: value for name, value in data.items()
+                          if name not in OVERLAY_FIELDS}
+        cache.set_many(fresh, settings.RECIPE_CACHE_TIMEOUT)
+        fragments.update(fresh)
+    fields = [field for field in serializer.fields.values()
+              if not field.write_only]
+    result = []
+    for key, recipe in zip(keys, recipes):
+        fragment = fragments[key]
+        data = {}
+        for field in fields:
+            name = field.field_name
+            if name in OVERLAY_FIELDS:
+                data[name] = field.to_representation(
+                    field.get_attribute(recipe))
+            else:
+                data[name] = fragment[name]
+        result.append(data)
+    return result
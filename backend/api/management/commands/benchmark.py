@@ -0,0 +1,103 @@
+import time
+
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Ingredient, Recipe
+from users.models import User
+
+from .explain_queries import api_client
+
+# Адрес и допустимое число SQL-запросов на один ответ.
+BENCHMARKS = (
+    ('/api/recipes/', 6),
+    ('/api/recipes/?is_favorited=1', 6),
+    ('/api/users/subscriptions/?recipes_limit=3', 3),
+    ('/api/ingredients/?name={prefix}', 0),
+    ('/api/recipes/download_shopping_cart/', 1),
+)
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(timings, rank):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, len(ordered) * rank // 100)]
+
+
+class Command(BaseCommand):
+    help = ("Measures latency percentiles and SQL query counts of the main "
+            "endpoints and fails when a query budget is exceeded. With "
+            "--sizes it fills the database with seed_load, so run it on a "
+            "scratch database")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[],
+            help='Number of recipes to benchmark at, e.g. 1000 10000 100000'
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--email', help='Email of the requesting user')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        failures = []
+        for size in sorted(options['sizes']) or [None]:
+            if size is not None:
+                missing = size - Recipe.objects.count()
+                if missing > 0:
+                    call_command('seed_load', recipes=missing,
+                                 users=max(missing // 10, 10),
+                                 seed=options['seed'] + size)
+            failures += self.run(options['email'], options['repeat'])
+        if failures:
+            raise CommandError('Query budget exceeded: ' + ', '.join(failures))
+
+    def run(self, email, repeat):
+        client = api_client(self.get_user(email))
+        name = Ingredient.objects.values_list('name', flat=True).first()
+        prefix = (name or '')[:3].lower()
+        print(f'=== {Recipe.objects.count()} recipes, '
+              f'{User.objects.count()} users')
+        failures = []
+        for url, budget in BENCHMARKS:
+            url = url.format(prefix=prefix)
+            self.request(client, url)
+            timings = []
+            queries = 0
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as context:
+                    start = time.perf_counter()
+                    status = self.request(client, url)
+                    timings.append((time.perf_counter() - start) * 1000)
+                queries = max(queries, len(context))
+            stats = ' '.join(f'p{rank}={percentile(timings, rank):.1f}ms'
+                             for rank in PERCENTILES)
+            verdict = 'ok' if queries <= budget else 'OVER BUDGET'
+            print(f'{url} [{status}] {stats} '
+                  f'queries={queries}/{budget} {verdict}')
+            if queries > budget:
+                failures.append(url)
+        return failures
+
+    @staticmethod
+    def request(client, url):
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code
+
+    @staticmethod
+    def get_user(email):
+        if email:
+            try:
+                return User.objects.get(email=email)
+            except User.DoesNotExist:
+                raise CommandError(f'User {email} does not exist')
+        user = User.objects.filter(shopping_cart__isnull=False).annotate(
+            follows=Count('follower', distinct=True)
+        ).order_by('-follows').first()
+        if user is None:
+            raise CommandError('No user with a shopping cart, '
+                               'run seed_load or pass --email')
+        return user
@@ -0,0 +1,62 @@
+from api.slow_queries import explain
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Tag
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+ENDPOINTS = (
+    '/api/recipes/',
+    '/api/recipes/?tags={tag}',
+    '/api/recipes/?author={user}',
+    '/api/recipes/?is_favorited=1',
+    '/api/recipes/?is_in_shopping_cart=1',
+    '/api/users/subscriptions/?recipes_limit=3',
+    '/api/recipes/download_shopping_cart/',
+)
+
+
+def api_client(user):
+    """Тестовый клиент, авторизованный токеном пользователя."""
+    token, _ = Token.objects.get_or_create(user=user)
+    host = settings.ALLOWED_HOSTS[0]
+    return Client(HTTP_AUTHORIZATION=f'Token {token.key}',
+                  HTTP_HOST='testserver' if host == '*' else host)
+
+
+class Command(BaseCommand):
+    help = ("Requests the main API endpoints as the given user and prints "
+            "EXPLAIN output for every SELECT they run")
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Email of the requesting user')
+        parser.add_argument('--analyze', action='store_true',
+                            help='Use EXPLAIN ANALYZE on PostgreSQL')
+        parser.add_argument('--url', action='append', default=[],
+                            help='Additional endpoint to explain')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError(f'User {options["email"]} does not exist')
+        client = api_client(user)
+        tag = Tag.objects.values_list('slug', flat=True).first() or ''
+        for url in (*ENDPOINTS, *options['url']):
+            url = url.format(tag=tag, user=user.id)
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            print(f'=== {url} [{response.status_code}] '
+                  f'{len(queries)} queries')
+            for query in queries.captured_queries:
+                if not query['sql'].lstrip().upper().startswith('SELECT'):
+                    continue
+                print(f'\n{query["sql"]}')
+                for line in explain(query['sql'], analyze=options['analyze']):
+                    print(f'    {line}')
+            print()
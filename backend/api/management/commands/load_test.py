@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+
+import requests
+from django.core.management import BaseCommand, CommandError
+
+from .benchmark import percentile
+
+URLS = (
+    '/api/recipes/',
+    '/api/recipes/?tags=breakfast',
+    '/api/tags/',
+    '/api/ingredients/?name=сах',
+    '/api/users/subscriptions/',
+)
+
+
+def process_tree_rss(pid):
+    """Суммарный RSS процесса и всех его потомков в килобайтах (Linux)."""
+    children = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as f:
+                parent = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(name))
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, ()))
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return total
+
+
+class Command(BaseCommand):
+    help = ("Loads a running server with concurrent clients and reports "
+            "throughput, latency and server memory per in-flight request. "
+            "Run it against the WSGI and the threaded deployment to compare")
+
+    def add_arguments(self, parser):
+        parser.add_argument('base_url', help='e.g. http://localhost:8000')
+        parser.add_argument('--concurrency', type=int, nargs='+',
+                            default=[1, 8, 32, 64])
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Seconds per concurrency level')
+        parser.add_argument('--token', help='Auth token of the client')
+        parser.add_argument('--pid', type=int,
+                            help='PID of the gunicorn master to measure RSS')
+        parser.add_argument('--url', action='append', default=[],
+                            help='Endpoint to request instead of defaults')
+
+    def handle(self, *args, **options):
+        urls = [options['base_url'].rstrip('/') + url
+                for url in options['url'] or URLS]
+        headers = ({'Authorization': f'Token {options["token"]}'}
+                   if options['token'] else {})
+        if options['pid'] and not os.path.exists(f'/proc/{options["pid"]}'):
+            raise CommandError(f'No process {options["pid"]}')
+        print('clients  req/s    p50 ms   p95 ms   p99 ms  errors  '
+              'rss MB  KB/in-flight')
+        for concurrency in options['concurrency']:
+            self.run(urls, headers, concurrency, options['duration'],
+                     options['pid'])
+
+    @staticmethod
+    def run(urls, headers, concurrency, duration, pid):
+        timings = []
+        errors = []
+        deadline = time.monotonic() + duration
+
+        def client(offset):
+            session = requests.Session()
+            session.headers.update(headers)
+            number = offset
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = session.get(urls[number % len(urls)])
+                    failed = response.status_code >= 500
+                except requests.RequestException:
+                    failed = True
+                (errors if failed else timings).append(
+                    (time.perf_counter() - start) * 1000)
+                number += 1
+
+        baseline = peak = process_tree_rss(pid) if pid else 0
+        threads = [threading.Thread(target=client, args=(number,))
+                   for number in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            if pid:
+                peak = max(peak, process_tree_rss(pid))
+            time.sleep(0.1)
+        if not timings:
+            print(f'{concurrency:7d}  all {len(errors)} requests failed')
+            return
+        per_request = (peak - baseline) / concurrency if pid else 0
+        print(f'{concurrency:7d} {len(timings) / duration:6.1f} '
+              f'{percentile(timings, 50):9.1f}{percentile(timings, 95):9.1f}'
+              f'{percentile(timings, 99):9.1f} {len(errors):7d} '
+              f'{peak / 1024:7.1f} {per_request:13.0f}')
@@ -0,0 +1,123 @@
+import threading
+from collections import Counter
+
+import requests
+from django.core.management import BaseCommand, CommandError
+from recipes.counters import COUNTERS, drifted
+from recipes.models import Favorite, Recipe, ShoppingCart
+from rest_framework.authtoken.models import Token
+from users.models import Follow, User
+
+TOGGLES = (
+    ('/api/recipes/{recipe}/favorite/', Favorite),
+    ('/api/recipes/{recipe}/shopping_cart/', ShoppingCart),
+    ('/api/users/{author}/subscribe/', Follow),
+)
+# Метод: (статус единственного успешного ответа, статус остальных).
+EXPECTED = {
+    'POST': (201, 400),
+    'DELETE': (204, 404),
+}
+
+
+def burst(sessions, method, url):
+    """Отправляет запросы из всех сессий одновременно."""
+    barrier = threading.Barrier(len(sessions))
+    statuses = [None] * len(sessions)
+
+    def client(number):
+        barrier.wait()
+        try:
+            statuses[number] = sessions[number].request(method,
+                                                        url).status_code
+        except requests.RequestException as error:
+            statuses[number] = type(error).__name__
+
+    threads = [threading.Thread(target=client, args=(number,))
+               for number in range(len(sessions))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return Counter(statuses)
+
+
+class Command(BaseCommand):
+    help = ("Fires concurrent identical favorite, shopping cart and follow "
+            "toggles at a running server and checks that exactly one of "
+            "them succeeds, none fails with 5xx and counters and the "
+            "shopping list stay consistent. Uses the server's database, "
+            "so run it on a scratch one")
+
+    def add_arguments(self, parser):
+        parser.add_argument('base_url', help='e.g. http://localhost:8000')
+        parser.add_argument('--clients', type=int, default=16)
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument('--email', help='Email of the requesting user')
+
+    def handle(self, *args, **options):
+        if options['clients'] < 2:
+            raise CommandError('At least 2 clients are needed for a race')
+        user, targets = self.get_targets(options['email'])
+        token, _ = Token.objects.get_or_create(user=user)
+        sessions = []
+        for _ in range(options['clients']):
+            session = requests.Session()
+            session.headers['Authorization'] = f'Token {token.key}'
+            sessions.append(session)
+        urls = [options['base_url'].rstrip('/') + path.format(**targets)
+                for path, _ in TOGGLES]
+        for url in urls:
+            sessions[0].delete(url)
+        shopping_list = self.shopping_list(user)
+
+        failures = []
+        for url, (path, model) in zip(urls, TOGGLES):
+            target_id = targets[COUNTERS[model][0]]
+            for _ in range(options['rounds']):
+                for method, (success, rejected) in EXPECTED.items():
+                    statuses = burst(sessions, method, url)
+                    problems = self.find_problems(
+                        model, user, target_id, method == 'POST',
+                        statuses, Counter({success: 1,
+                                           rejected: len(sessions) - 1}))
+                    result = ' '.join(f'{status}x{count}' for status, count
+                                      in sorted(statuses.items(), key=str))
+                    print(f'{method} {path} {result} '
+                          f'{", ".join(problems) or "ok"}')
+                    if problems:
+                        failures.append(f'{method} {path}')
+        if self.shopping_list(user) != shopping_list:
+            failures.append('shopping list')
+            print('Shopping list differs from the one before the run')
+        if failures:
+            raise CommandError('Races detected: ' + ', '.join(failures))
+
+    @staticmethod
+    def get_targets(email):
+        user = (User.objects.get(email=email) if email
+                else User.objects.first())
+        if user is None:
+            raise CommandError('No users in the database')
+        recipe = Recipe.objects.exclude(author=user).first()
+        author = User.objects.exclude(pk=user.pk).first()
+        if recipe is None or author is None:
+            raise CommandError('Need two users and a recipe of another user')
+        return user, {'recipe': recipe.pk, 'author': author.pk}
+
+    @staticmethod
+    def find_problems(model, user, target_id, linked, statuses, expected):
+        problems = []
+        if statuses != expected:
+            problems.append('unexpected statuses')
+        rows = model.objects.filter(
+            **{'user': user, COUNTERS[model][0]: target_id}).count()
+        if rows != linked:
+            problems.append(f'{rows} rows')
+        if drifted(model).filter(pk=target_id).exists():
+            problems.append('counter drifted')
+        return problems
+
+    @staticmethod
+    def shopping_list(user):
+        return set(user.shopping_list.values_list('ingredient_id', 'amount'))
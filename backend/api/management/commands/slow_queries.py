@@ -0,0 +1,69 @@
+import json
+import os.path
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+ORDERINGS = {
+    'total': lambda query: query['total_ms'],
+    'max': lambda query: query['max_ms'],
+    'count': lambda query: query['count'],
+}
+
+
+def read_entries(path):
+    """Записи журнала вместе с ротированными файлами, от старых к новым."""
+    for number in (3, 2, 1, None):
+        file_path = path if number is None else f'{path}.{number}'
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+class Command(BaseCommand):
+    help = "Summarizes the slow query log by normalized statement"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=settings.SLOW_QUERY_LOG,
+                            help='Path to the slow query log')
+        parser.add_argument('--order', choices=ORDERINGS, default='total')
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--explain', action='store_true',
+                            help='Print query plans and stacks')
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['log']):
+            raise CommandError(f'{options["log"]} does not exist')
+        queries = {}
+        for entry in read_entries(options['log']):
+            query = queries.setdefault(entry['fingerprint'], {
+                'sql': entry['sql'], 'count': 0, 'total_ms': 0,
+                'max_ms': 0, 'views': set(), 'explain': None, 'stack': None,
+            })
+            query['count'] += 1
+            query['total_ms'] += entry['duration_ms']
+            query['max_ms'] = max(query['max_ms'], entry['duration_ms'])
+            query['views'].add(entry['view'] or entry['path'])
+            query['explain'] = query['explain'] or entry['explain']
+            query['stack'] = query['stack'] or entry['stack']
+        worst = sorted(queries.values(), key=ORDERINGS[options['order']],
+                       reverse=True)[:options['limit']]
+        for query in worst:
+            print(f'=== {query["count"]} calls, '
+                  f'total {query["total_ms"]:.0f} ms, '
+                  f'avg {query["total_ms"] / query["count"]:.0f} ms, '
+                  f'max {query["max_ms"]:.0f} ms')
+            print('views: ' + ', '.join(sorted(query['views'])))
+            print(query['sql'])
+            if options['explain']:
+                for line in query['explain'] or ():
+                    print(f'    {line}')
+                for frame in query['stack'] or ():
+                    print(f'  at {frame}')
+            print()
+        print(f'{len(queries)} distinct slow queries')
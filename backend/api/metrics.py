@@ -0,0 +1,60 @@
+import os
+import time
+
+from prometheus_client import (CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+# При запуске нескольких воркеров gunicorn значения пишутся в файлы
+# каталога PROMETHEUS_MULTIPROC_DIR и складываются при выдаче метрик.
+MULTIPROCESS = 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+
+REQUESTS = Counter(
+    'foodgram_requests_total', 'Количество запросов',
+    ('endpoint', 'method', 'status')
+)
+LATENCY = Histogram(
+    'foodgram_request_duration_seconds', 'Время обработки запроса',
+    ('endpoint',),
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+)
+QUERIES = Histogram(
+    'foodgram_request_sql_queries', 'Количество SQL-запросов на запрос',
+    ('endpoint',), buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+)
+SQL_TIME = Histogram(
+    'foodgram_request_sql_duration_seconds',
+    'Суммарное время SQL-запросов на запрос', ('endpoint',),
+    buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5)
+)
+
+
+class QueryStats:
+    """Обёртка execute_wrapper, считающая запросы и их время."""
+
+    def __init__(self, request=None):
+        self.count = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+def observe(endpoint, method, status, duration, queries):
+    REQUESTS.labels(endpoint, method, status).inc()
+    LATENCY.labels(endpoint).observe(duration)
+    QUERIES.labels(endpoint).observe(queries.count)
+    SQL_TIME.labels(endpoint).observe(queries.duration)
+
+
+def export():
+    """Метрики всех процессов в текстовом формате Prometheus."""
+    if not MULTIPROCESS:
+        return generate_latest()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
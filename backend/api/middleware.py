@@ -0,0 +1,72 @@
+import time
+
+from django.db import connection
+from django.http import HttpResponse
+
+from .metrics import QueryStats, observe
+from .profiling import is_staff, profile, profiling_requested
+from .slow_queries import SlowQueryLogger
+
+
+class ExecuteWrapperMiddleware:
+    """Оборачивает все SQL-запросы, выполненные при обработке запроса.
+
+    Обёртка создаётся на каждый запрос вызовом wrapper_class(request).
+    """
+    wrapper_class = None
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        wrapper = self.wrapper_class(request)
+        start = time.perf_counter()
+        with connection.execute_wrapper(wrapper):
+            response = self.get_response(request)
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, request, response, wrapper, start)
+        else:
+            self.finish(request, response, wrapper, start)
+        return response
+
+    def stream(self, content, request, response, wrapper, start):
+        """Потоковые ответы выполняют запросы уже после выхода из view."""
+        try:
+            with connection.execute_wrapper(wrapper):
+                yield from content
+        finally:
+            self.finish(request, response, wrapper, start)
+
+    def finish(self, request, response, wrapper, start):
+        pass
+
+
+class MetricsMiddleware(ExecuteWrapperMiddleware):
+    """Собирает время ответа и SQL-статистику по каждому view и action."""
+    wrapper_class = QueryStats
+
+    def finish(self, request, response, wrapper, start):
+        match = request.resolver_match
+        observe((match.url_name or match.view_name) if match else 'unmatched',
+                request.method, response.status_code,
+                time.perf_counter() - start, wrapper)
+
+
+class SlowQueryMiddleware(ExecuteWrapperMiddleware):
+    """Записывает в журнал запросы дольше SLOW_QUERY_MS."""
+    wrapper_class = SlowQueryLogger
+
+
+class ProfilingMiddleware:
+    """Отдаёт сотрудникам профиль запроса с ?profile= или X-Profile."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sort = profiling_requested(request)
+        if sort is None or not is_staff(request):
+            return self.get_response(request)
+        return HttpResponse(profile(self.get_response, request, sort),
+                            content_type='text/plain; charset=utf-8')
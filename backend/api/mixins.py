@@ -0,0 +1,67 @@
+from hashlib import md5
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from recipes.versions import get_versions, version_key
+
+
+class NotModifiedError(Exception):
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """Отвечает 304 на повторный GET, если данные не менялись.
+
+    Валидатор строится из версий таблиц conditional_models, поэтому
+    проверка не обращается к базе и выполняется до сериализации.
+    Если ответ зависит от пользователя, conditional_per_user добавляет
+    в валидатор его id и заголовок Vary: Authorization.
+    """
+    conditional_models = ()
+    conditional_actions = ('list', 'retrieve')
+    conditional_per_user = False
+
+    def get_etag_suffix(self, request):
+        """Различает представления одних и тех же данных, например сжатые."""
+        return ''
+
+    def get_conditional_validators(self, request):
+        versions = get_versions(
+            [version_key(model) for model in self.conditional_models])
+        user_id = request.user.id if self.conditional_per_user else None
+        digest = md5(f'{user_id}:{versions}'.encode()).hexdigest()
+        return (quote_etag(digest + self.get_etag_suffix(request)),
+                max(versions) // 10 ** 9)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.conditional_validators = None
+        if (request.method not in ('GET', 'HEAD')
+                or self.action not in self.conditional_actions):
+            return
+        self.conditional_validators = self.get_conditional_validators(
+            request)
+        etag, last_modified = self.conditional_validators
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            raise NotModifiedError(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModifiedError):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        validators = getattr(self, 'conditional_validators', None)
+        if validators and response.status_code in (200, 304):
+            etag, last_modified = validators
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            if self.conditional_per_user:
+                patch_vary_headers(response, ('Authorization',))
+        return response
@@ -1,6 +1,32 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class CustomPagination(PageNumberPagination):
     page_size_query_param = 'limit'
     page_size = 6
+
+
+class RecipeCursorPagination(CursorPagination):
+    page_size_query_param = 'limit'
+    page_size = 6
+    ordering = ('-created', '-id')
+
+
+class RecipePagination(CustomPagination):
+    """Постраничная пагинация, переключаемая на курсорную по ?cursor=."""
+    cursor_query_param = RecipeCursorPagination.cursor_query_param
+
+    def __init__(self):
+        self.cursor_pagination = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param in request.query_params:
+            self.cursor_pagination = RecipeCursorPagination()
+            return self.cursor_pagination.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_pagination is not None:
+            return self.cursor_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -1,3 +1,6 @@
+from hmac import compare_digest
+
+from django.conf import settings
 from rest_framework import permissions
 
 
@@ -7,3 +10,14 @@ class IsAuthorOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         return (request.method in permissions.SAFE_METHODS
                 or obj.author == request.user)
+
+
+class IsAdminOrMetricsToken(permissions.BasePermission):
+    """Метрики доступны администраторам и по токену METRICS_TOKEN."""
+
+    def has_permission(self, request, view):
+        if request.user and request.user.is_staff:
+            return True
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        return bool(settings.METRICS_TOKEN) and compare_digest(
+            header, f'Bearer {settings.METRICS_TOKEN}')
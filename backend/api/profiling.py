@@ -0,0 +1,96 @@
+import cProfile
+import io
+import pstats
+import time
+
+from django.db import connection
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import CachedTokenAuthentication
+
+SORT_KEYS = ('cumulative', 'tottime', 'ncalls')
+ENABLE_VALUES = ('1', 'true', 'yes')
+PROFILE_LINES = 60
+
+
+def profiling_requested(request):
+    """Ключ сортировки профиля или None, если профилирование не запрошено."""
+    value = (request.GET.get('profile')
+             or request.META.get('HTTP_X_PROFILE', '')).strip().lower()
+    if value in SORT_KEYS:
+        return value
+    if value in ENABLE_VALUES:
+        return SORT_KEYS[0]
+    return None
+
+
+def drop_profile_param(request):
+    """Убирает ?profile= из запроса, чтобы он прошёл тем же путём, что
+    и без профилирования: параметр выключил бы кэш каталога и ленты."""
+    if 'profile' not in request.GET:
+        return
+    query = request.GET.copy()
+    del query['profile']
+    request.GET = query
+    request.META['QUERY_STRING'] = query.urlencode()
+
+
+def is_staff(request):
+    """Сотрудник по сессии или по токену DRF."""
+    if request.user.is_staff:
+        return True
+    try:
+        credentials = CachedTokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return credentials is not None and credentials[0].is_staff
+
+
+class QueryTimeline:
+    """Обёртка execute_wrapper, запоминающая порядок и время запросов."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((start - self.start,
+                                 time.perf_counter() - start, sql))
+
+
+def profile(get_response, request, sort):
+    """Выполняет запрос под cProfile и возвращает текстовый отчёт."""
+    path = request.get_full_path()
+    drop_profile_param(request)
+    timeline = QueryTimeline()
+    profiler = cProfile.Profile()
+    with connection.execute_wrapper(timeline):
+        profiler.enable()
+        try:
+            response = get_response(request)
+            if response.streaming:
+                size = sum(len(chunk) for chunk in response.streaming_content)
+            else:
+                size = len(response.content)
+        finally:
+            profiler.disable()
+    duration = time.perf_counter() - timeline.start
+    sql_time = sum(query[1] for query in timeline.queries)
+    report = io.StringIO()
+    report.write(
+        f'{request.method} {path} -> '
+        f'{response.status_code}, {size} bytes, {duration * 1000:.1f} ms, '
+        f'{len(timeline.queries)} SQL queries ({sql_time * 1000:.1f} ms)\n\n'
+        'SQL timeline (start, duration):\n'
+    )
+    for offset, query_time, sql in timeline.queries:
+        report.write(f'{offset * 1000:9.1f} ms {query_time * 1000:8.1f} ms  '
+                     f'{sql}\n')
+    report.write(f'\ncProfile, sorted by {sort}:\n')
+    pstats.Stats(profiler, stream=report).sort_stats(sort).print_stats(
+        PROFILE_LINES)
+    return report.getvalue()
@@ -0,0 +1,37 @@
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Определяет формат списка покупок по ?format= или заголовку Accept.
+
+    Сам файл отдаётся потоком из представления, поэтому рендерер
+    используется только для согласования формата и вывода ошибок.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+class PlainTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class PDFRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+
+SHOPPING_LIST_RENDERERS = (PlainTextRenderer, CSVRenderer,
+                           JSONRenderer, PDFRenderer)
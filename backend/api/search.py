@@ -0,0 +1,77 @@
+from bisect import bisect_left
+from collections import Counter
+
+from recipes.models import Ingredient
+from recipes.versions import cached_per_version
+
+FUZZY_THRESHOLD = 0.3
+
+
+def trigrams(text):
+    text = f'  {text} '
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Сначала идут совпадения по началу названия, затем по подстроке,
+    затем похожие названия (с опечатками) по сходству триграмм.
+    """
+
+    def __init__(self, ingredients):
+        self.ingredients = sorted(ingredients,
+                                  key=lambda item: item.name.lower())
+        self.keys = [item.name.lower() for item in self.ingredients]
+        self.trigrams = [trigrams(key) for key in self.keys]
+        self.postings = {}
+        for position, key_trigrams in enumerate(self.trigrams):
+            for trigram in key_trigrams:
+                self.postings.setdefault(trigram, []).append(position)
+
+    def prefix_matches(self, query):
+        position = bisect_left(self.keys, query)
+        while (position < len(self.keys)
+               and self.keys[position].startswith(query)):
+            yield position
+            position += 1
+
+    def substring_matches(self, query):
+        inner = [query[i:i + 3] for i in range(len(query) - 2)]
+        if inner:
+            candidates = set.intersection(*(
+                set(self.postings.get(trigram, ())) for trigram in inner))
+        else:
+            candidates = range(len(self.keys))
+        return sorted(position for position in candidates
+                      if query in self.keys[position])
+
+    def fuzzy_matches(self, query):
+        query_trigrams = trigrams(query)
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(self.postings.get(trigram, ()))
+        scored = []
+        for position, common in shared.items():
+            similarity = common / (len(query_trigrams) + len(
+                self.trigrams[position]) - common)
+            if similarity >= FUZZY_THRESHOLD:
+                scored.append((-similarity, position))
+        return [position for _, position in sorted(scored)]
+
+    def search(self, query, limit):
+        query = query.strip().lower()
+        found = {}
+        for matches in (self.prefix_matches, self.substring_matches,
+                        self.fuzzy_matches):
+            for position in matches(query):
+                found.setdefault(position, self.ingredients[position])
+                if len(found) == limit:
+                    return list(found.values())
+        return list(found.values())
+
+
+@cached_per_version(Ingredient)
+def get_ingredient_index():
+    return IngredientIndex(Ingredient.objects.only(
+        'id', 'name', 'measurement_unit').order_by())
@@ -1,10 +1,13 @@
+from django.conf import settings
+from django.db import connection, transaction
 from djoser.serializers import UserSerializer as CustomUserSerializer
 from drf_extra_fields.fields import Base64ImageField
-from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                            ShoppingCart, Tag)
+from recipes.models import (Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCartIngredient, Tag)
 from rest_framework import serializers
-from rest_framework.validators import UniqueTogetherValidator
-from users.models import Follow, User
+from users.models import User
+
+from .fragments import render_recipes
 
 
 class UserSerializer(CustomUserSerializer):
@@ -13,11 +16,15 @@ class UserSerializer(CustomUserSerializer):
     class Meta:
         model = User
         fields = ('id', 'email', 'username', 'first_name', 'last_name',
-                  'is_subscribed')
+                  'is_subscribed', 'recipes_count', 'followers_count')
+        read_only_fields = ('recipes_count', 'followers_count')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         return (request and request.user.is_authenticated
+                and obj.pk != request.user.pk
                 and obj.following.filter(user=request.user).exists())
 
 
@@ -46,8 +53,7 @@ class IngredientRecipeReadSerializer(serializers.ModelSerializer):
 
 
 class IngredientRecipeCreateSerializer(serializers.ModelSerializer):
-    id = serializers.SlugRelatedField(queryset=Ingredient.objects.all(),
-                                      slug_field='id')
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(write_only=True, min_value=1)
 
     class Meta:
@@ -55,6 +61,13 @@ class IngredientRecipeCreateSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
+class RecipeListSerializer(serializers.ListSerializer):
+    """Список рецептов, собираемый из кэша одним обращением."""
+
+    def to_representation(self, data):
+        return render_recipes(self.child, list(data))
+
+
 class RecipeReadSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True)
     ingredients = serializers.SerializerMethodField()
@@ -65,18 +78,29 @@ class RecipeReadSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = '__all__'
+        exclude = ('search_vector', 'updated')
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, instance):
+        return render_recipes(self, [instance])[0]
+
+    def build_representation(self, instance):
+        return super().to_representation(instance)
 
     def get_ingredients(self, obj):
-        ingredients = IngredientRecipe.objects.filter(recipe=obj).all()
+        ingredients = obj.recipe_ingredients.all()
         return IngredientRecipeReadSerializer(ingredients, many=True).data
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         return (request and request.user.is_authenticated
                 and obj.favorites.filter(user=request.user).exists())
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         return (request and request.user.is_authenticated
                 and obj.shopping_cart.filter(user=request.user).exists())
@@ -98,34 +122,28 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
                   'name', 'image', 'text', 'cooking_time')
 
     def validate_tags(self, tags):
-        tags_list = []
         if not tags:
             raise serializers.ValidationError(
                 {'tags': 'Нужно выбрать хотя бы один тег'}
             )
-        for tag in tags:
-            if not Tag.objects.filter(id=tag.id).exists():
-                raise serializers.ValidationError(
-                    'Указанного тега не существует')
-            if tag.id in tags_list:
-                raise serializers.ValidationError(
-                    'Теги рецепта не могут повторяться')
-            tags_list.append(tag.id)
+        if len(set(tags)) != len(tags):
+            raise serializers.ValidationError(
+                'Теги рецепта не могут повторяться')
         return tags
 
     def validate_ingredients(self, ingredients):
-        ingredients_list = []
         if not ingredients:
             raise serializers.ValidationError(
                 'Нужно выбрать хотя бы один ингредиент')
-        for ingredient in ingredients:
-            if ingredient in ingredients_list:
-                raise serializers.ValidationError(
-                    'Ингредиенты в рецепте не могут повторяться')
-            ingredients_list.append(ingredient)
-            if int(ingredient.get('amount')) < 1:
-                raise serializers.ValidationError(
-                    'Укажите верное кол-во ингредиента')
+        ids = {ingredient['id'] for ingredient in ingredients}
+        if len(ids) != len(ingredients):
+            raise serializers.ValidationError(
+                'Ингредиенты в рецепте не могут повторяться')
+        missing = ids - set(Ingredient.objects.filter(
+            id__in=ids).values_list('id', flat=True))
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиентов с id {sorted(missing)} не существует')
         return ingredients
 
     def validate_cooking_time(self, cooking_time):
@@ -138,11 +156,48 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
     def add_ingredients(recipe, ingredients):
         IngredientRecipe.objects.bulk_create(
             [IngredientRecipe(
-                ingredient=ingredient.pop('id'),
-                recipe=recipe, amount=ingredient.pop('amount')
+                ingredient_id=ingredient['id'],
+                recipe=recipe, amount=ingredient['amount']
             ) for ingredient in ingredients]
         )
 
+    @staticmethod
+    def update_ingredients(recipe, ingredients):
+        """Пишет только разницу между старым и новым составом рецепта."""
+        rows = {row.ingredient_id: row for row
+                in IngredientRecipe.objects.filter(recipe=recipe)}
+        old_amounts = {ingredient_id: row.amount for ingredient_id, row
+                       in rows.items() if ingredient_id is not None}
+        new_amounts = {ingredient['id']: ingredient['amount']
+                       for ingredient in ingredients}
+        # Явный DELETE без сигналов post_delete: список покупок
+        # обновляется ниже одним вызовом на всю разницу.
+        removed = [row.pk for ingredient_id, row in rows.items()
+                   if ingredient_id not in new_amounts]
+        if removed:
+            quote = connection.ops.quote_name
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {quote(IngredientRecipe._meta.db_table)} '
+                    f'WHERE {quote(IngredientRecipe._meta.pk.column)} IN '
+                    f'({", ".join(["%s"] * len(removed))})', removed)
+        changed = []
+        for ingredient_id, amount in new_amounts.items():
+            row = rows.get(ingredient_id)
+            if row is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        IngredientRecipe.objects.bulk_update(changed, ('amount',))
+        IngredientRecipe.objects.bulk_create([
+            IngredientRecipe(recipe=recipe, ingredient_id=ingredient_id,
+                             amount=amount)
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in rows
+        ])
+        ShoppingCartIngredient.change_recipe(recipe, old_amounts,
+                                             new_amounts)
+
+    @transaction.atomic
     def create(self, validated_data):
         request = self.context.get('request')
         tags = validated_data.pop('tags')
@@ -152,13 +207,14 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         self.add_ingredients(recipe=recipe, ingredients=ingredients)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.tags.clear()
-        IngredientRecipe.objects.filter(recipe=instance).delete()
-        tags = validated_data.pop('tags')
-        instance.tags.set(tags)
-        ingredients = validated_data.pop('ingredients')
-        self.add_ingredients(recipe=instance, ingredients=ingredients)
+        tags = validated_data.pop('tags', None)
+        if tags is not None:
+            instance.tags.set(tags)
+        ingredients = validated_data.pop('ingredients', None)
+        if ingredients is not None:
+            self.update_ingredients(recipe=instance, ingredients=ingredients)
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
@@ -173,75 +229,52 @@ class RecipeShortSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
-
-    class Meta:
-        model = Favorite
-        fields = ('user', 'recipe')
-
-    def validate(self, data):
-        user = data['user']
-        if user.favorites.filter(recipe=data['recipe']).exists():
-            raise serializers.ValidationError(
-                'Рецепт уже в избранном'
-            )
-        return data
-
-
-class ShoppingCartSerializer(serializers.ModelSerializer):
-
-    class Meta:
-        model = ShoppingCart
-        fields = ('user', 'recipe')
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False,
+        max_length=settings.BULK_RECIPES_LIMIT
+    )
 
-    def validate(self, data):
-        user = data['user']
-        if user.shopping_cart.filter(recipe=data['recipe']).exists():
+    def validate_recipes(self, value):
+        recipe_ids = list(dict.fromkeys(value))
+        existing = set(Recipe.objects.filter(
+            pk__in=recipe_ids).values_list('pk', flat=True))
+        missing = [recipe_id for recipe_id in recipe_ids
+                   if recipe_id not in existing]
+        if missing:
             raise serializers.ValidationError(
-                'Рецепт уже в корзине'
-            )
-        return data
+                f'Рецептов с id {missing} не существует.')
+        return recipe_ids
 
 
 class FollowListSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.SerializerMethodField(read_only=True)
 
     class Meta(UserSerializer.Meta):
-        fields = UserSerializer.Meta.fields + ('recipes', 'recipes_count')
-        read_only_fields = ('id', 'email', 'username',
-                            'first_name', 'last_name')
+        fields = UserSerializer.Meta.fields + ('recipes',)
+        read_only_fields = ('id', 'email', 'username', 'first_name',
+                            'last_name', 'recipes_count', 'followers_count')
+
+    @staticmethod
+    def get_recipes_limit(request):
+        limit = request.query_params.get('recipes_limit')
+        if limit is None:
+            return None
+        try:
+            return serializers.IntegerField(min_value=0).run_validation(
+                limit)
+        except serializers.ValidationError as error:
+            raise serializers.ValidationError(
+                {'recipes_limit': error.detail})
 
     def get_recipes(self, obj):
+        if hasattr(obj, 'recent_recipes'):
+            return RecipeShortSerializer(obj.recent_recipes, many=True).data
         request = self.context.get('request')
         if not request:
             return False
-        limit = request.GET.get('recipes_limit')
+        limit = self.get_recipes_limit(request)
         queryset = obj.recipes.all()
-        if limit:
-            queryset = queryset[:int(limit)]
+        if limit is not None:
+            queryset = queryset[:limit]
         return RecipeShortSerializer(queryset, many=True).data
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
-
-class FollowSerializer(serializers.ModelSerializer):
-
-    class Meta:
-        model = Follow
-        fields = '__all__'
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Follow.objects.all(),
-                fields=('user', 'author')
-            )
-        ]
-
-    def validate(self, data):
-        if self.context['request'].user == data['author']:
-            raise serializers.ValidationError('Нельзя подписываться на себя')
-        return data
-
-    def to_representation(self, instance):
-        return FollowListSerializer(instance).data
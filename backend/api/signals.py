@@ -0,0 +1,26 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from recipes.models import Recipe
+from rest_framework.authtoken.models import Token
+from users.models import Follow, User
+
+from .authentication import forget_token, forget_user
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    forget_token(instance.key)
+
+
+@receiver((post_save, post_delete), sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields != frozenset(('last_login',)):
+        forget_user(instance.pk)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=Follow)
+def author_counters_changed(sender, instance, created=True, **kwargs):
+    """Счётчики автора в кэшированном пользователе устаревают."""
+    if created and instance.author_id:
+        forget_user(instance.author_id)
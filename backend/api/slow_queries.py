@@ -0,0 +1,111 @@
+import hashlib
+import json
+import logging
+import os.path
+import random
+import re
+import sys
+import time
+import traceback
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger('foodgram.slow_queries')
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LISTS = re.compile(r'\((?:\s*\?\s*,)*\s*\?\s*\)')
+# Модули, которые сами оборачивают запросы и не нужны в стеке.
+INSTRUMENTATION = tuple(
+    os.path.join(os.path.dirname(__file__), name)
+    for name in ('middleware.py', 'metrics.py', 'slow_queries.py')
+)
+
+
+def explain(sql, params=None, analyze=False):
+    """Возвращает план выполнения запроса в виде списка строк."""
+    if connection.vendor == 'postgresql':
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS) ' if analyze else 'EXPLAIN '
+    elif connection.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    else:
+        prefix = 'EXPLAIN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        return [str(row[-1]) for row in cursor.fetchall()]
+
+
+def normalize(sql):
+    """Заменяет литералы и списки параметров, чтобы сгруппировать запросы."""
+    sql = LITERALS.sub('?', sql).replace('%s', '?')
+    return ' '.join(PLACEHOLDER_LISTS.sub('(...)', sql).split())
+
+
+def project_stack():
+    """Кадры стека из кода проекта, без Django и сторонних пакетов."""
+    return [
+        f'{frame.filename}:{frame.lineno} in {frame.name}'
+        for frame in traceback.extract_stack()
+        if frame.filename.startswith(settings.BASE_DIR)
+        and 'site-packages' not in frame.filename
+        and frame.filename not in INSTRUMENTATION
+    ]
+
+
+class SlowQueryLogger:
+    """Обёртка execute_wrapper, записывающая медленные запросы в журнал.
+
+    Для первого появления каждого нормализованного запроса сохраняются
+    план выполнения и стек, для остальных стек пишется выборочно.
+    Запросы, упавшие по таймауту или с ошибкой, тоже попадают в журнал.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - start) * 1000
+            if duration >= settings.SLOW_QUERY_MS and not self.explaining:
+                self.log(sql, None if many else params, duration,
+                         sys.exc_info()[1])
+
+    def log(self, sql, params, duration, error=None):
+        normalized = normalize(sql)
+        fingerprint = hashlib.md5(normalized.encode()).hexdigest()
+        first = cache.add(f'slow_query:{fingerprint}', True, None)
+        match = self.request.resolver_match
+        entry = {
+            'time': timezone.now().isoformat(),
+            'duration_ms': round(duration, 2),
+            'fingerprint': fingerprint,
+            'sql': normalized,
+            'view': match.url_name if match else None,
+            'method': self.request.method,
+            'path': self.request.path,
+            'error': repr(error) if error else None,
+            'stack': None,
+            'explain': None,
+        }
+        if first or random.random() < settings.SLOW_QUERY_STACK_RATE:
+            entry['stack'] = project_stack()
+        if (first and error is None
+                and sql.lstrip().upper().startswith('SELECT')):
+            entry['explain'] = self.explain(sql, params)
+        logger.warning(json.dumps(entry, ensure_ascii=False))
+
+    def explain(self, sql, params):
+        self.explaining = True
+        try:
+            with transaction.atomic():
+                return explain(sql, params, settings.SLOW_QUERY_ANALYZE)
+        except DatabaseError as error:
+            return [f'EXPLAIN failed: {error}']
+        finally:
+            self.explaining = False
@@ -1,73 +1,202 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Prefetch, Subquery, Value
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as CustomUserView
-from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                            ShoppingCart, Tag)
+from prometheus_client import CONTENT_TYPE_LATEST
+from recipes.bulk import add_links, remove_links
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                            ShoppingCartIngredient, Tag)
+from recipes.versions import get_versions, version_key
 from rest_framework import filters, status, viewsets
+from rest_framework.authentication import SessionAuthentication
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from users.models import Follow, User
 
+from .authentication import CachedTokenAuthentication, forget_user
+from .catalog import get_ingredient_catalog, pick_encoding
+from .exports import EXPORTERS
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import CustomPagination
-from .permissions import IsAuthorOrReadOnly
-from .serializers import (FavoriteSerializer, FollowListSerializer,
-                          FollowSerializer, IngredientSerializer,
-                          RecipeReadSerializer, RecipeWriteSerializer,
-                          ShoppingCartSerializer, TagSerializer,
-                          UserSerializer)
+from .metrics import export
+from .mixins import ConditionalGetMixin
+from .pagination import CustomPagination, RecipePagination
+from .permissions import IsAdminOrMetricsToken, IsAuthorOrReadOnly
+from .renderers import SHOPPING_LIST_RENDERERS
+from .search import get_ingredient_index
+from .serializers import (FollowListSerializer, IngredientSerializer,
+                          RecipeIdsSerializer, RecipeReadSerializer,
+                          RecipeWriteSerializer, TagSerializer, UserSerializer)
+
+# Параметры, которые читает лента рецептов для анонимов.
+FEED_CACHE_PARAMS = ('page', 'limit', 'tags', 'author', 'cursor', 'search')
+ALREADY_ADDED = {
+    Favorite: 'Рецепт уже в избранном',
+    ShoppingCart: 'Рецепт уже в корзине',
+    Follow: 'Вы уже подписаны на этого автора',
+}
+
 
+def subscribed_to(user):
+    """Выражение для аннотации is_subscribed пользователей."""
+    if user.is_anonymous:
+        return Value(False)
+    return Exists(Follow.objects.filter(user=user, author=OuterRef('pk')))
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+
+class TagViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
     filter_backends = (filters.SearchFilter,)
     search_fields = ('name',)
+    conditional_models = (Tag,)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     filterset_class = IngredientFilter
+    conditional_models = (Ingredient,)
+
+    def list(self, request, *args, **kwargs):
+        if self.serves_catalog(request):
+            return self.catalog_response(request)
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        ingredients = get_ingredient_index().search(
+            name, settings.INGREDIENT_SEARCH_LIMIT)
+        return Response(self.get_serializer(ingredients, many=True).data)
+
+    def serves_catalog(self, request):
+        """Полный список отдаётся готовым сжатым блобом из кэша."""
+        return (self.action == 'list' and not request.query_params
+                and request.accepted_renderer.format == 'json')
+
+    def get_etag_suffix(self, request):
+        if not self.serves_catalog(request):
+            return ''
+        encoding = self.catalog_encoding(request)
+        return '' if encoding == 'identity' else f'-{encoding}'
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        if (response.status_code in (200, 304)
+                and self.serves_catalog(request)):
+            patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    @staticmethod
+    def catalog_encoding(request):
+        return pick_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+
+    def catalog_response(self, request):
+        catalog = get_ingredient_catalog()
+        encoding = self.catalog_encoding(request)
+        response = HttpResponse(catalog[encoding],
+                                content_type='application/json')
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+        response['Content-Length'] = len(catalog[encoding])
+        return response
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly,)
-    pagination_class = CustomPagination
+    pagination_class = RecipePagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    conditional_models = (Recipe, Tag, Ingredient, User,
+                          Favorite, ShoppingCart, Follow)
+    conditional_actions = ('retrieve',)
+    conditional_per_user = True
+    lookup_value_regex = r'\d+'
+
+    def get_queryset(self):
+        user = self.request.user
+        if user.is_anonymous:
+            is_favorited = is_in_shopping_cart = Value(False)
+        else:
+            is_favorited = Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')))
+            is_in_shopping_cart = Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')))
+        # Поисковый вектор нужен только в WHERE, в выборку он не идёт.
+        return self.queryset.defer('search_vector').prefetch_related(
+            Prefetch('author', queryset=User.objects.annotate(
+                is_subscribed=subscribed_to(user)))
+        ).annotate(
+            is_favorited=is_favorited,
+            is_in_shopping_cart=is_in_shopping_cart
+        )
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
+    def list(self, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            response = super().list(request, *args, **kwargs)
+            patch_cache_control(response, private=True)
+            return response
+        key = self.anonymous_feed_key(request)
+        data = cache.get(key) if key else None
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            if key:
+                cache.set(key, data, settings.ANONYMOUS_FEED_TIMEOUT)
+        response = Response(data)
+        patch_cache_control(response, public=True,
+                            max_age=settings.ANONYMOUS_FEED_TIMEOUT)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
     @staticmethod
-    def add_to(serializer_class, request, pk):
-        context = {'request': request}
-        recipe = get_object_or_404(Recipe, id=pk)
-        data = {
-            'user': request.user.id,
-            'recipe': recipe.id
-        }
-        serializer = serializer_class(data=data, context=context)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    def anonymous_feed_key(request):
+        """Ключ ленты для анонимов: схема и хост (ссылки в ответе
+        абсолютные), параметры из FEED_CACHE_PARAMS и версии каталога.
+
+        Запросы с другими параметрами не кэшируются: иначе ими можно
+        заполнить кэш, а ссылки next/previous унесли бы их в чужие ответы.
+        """
+        if set(request.query_params) - set(FEED_CACHE_PARAMS):
+            return None
+        params = sorted(
+            (name, sorted(request.query_params.getlist(name)))
+            for name in request.query_params
+        )
+        versions = get_versions([version_key(model) for model
+                                 in (Recipe, Tag, Ingredient, User)])
+        digest = md5(repr((params, versions)).encode()).hexdigest()
+        return f'feed:{request.build_absolute_uri("/")}:{digest}'
+
+    @staticmethod
+    def add_to(model, request, pk):
+        # Один INSERT ... ON CONFLICT: о причине отказа спрашиваем базу,
+        # только если строка не вставилась.
+        if not add_links(model, request.user, [int(pk)]):
+            get_object_or_404(Recipe.objects.only('pk'), id=pk)
+            raise ValidationError({'errors': ALREADY_ADDED[model]})
+        return Response({'user': request.user.id, 'recipe': int(pk)},
+                        status=status.HTTP_201_CREATED)
 
     @staticmethod
     def del_from(model, request, pk):
-        get_object_or_404(
-            model,
-            user=request.user,
-            recipe=get_object_or_404(Recipe, id=pk)
-        ).delete()
+        if not remove_links(model, request.user, [int(pk)]):
+            raise Http404
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['post', 'delete'],
@@ -75,7 +204,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
             url_path='favorite')
     def favorites(self, request, pk):
         if request.method == 'POST':
-            return self.add_to(FavoriteSerializer, request, pk)
+            return self.add_to(Favorite, request, pk)
         return self.del_from(Favorite, request, pk)
 
     @action(detail=True, methods=['post', 'delete'],
@@ -83,33 +212,63 @@ class RecipeViewSet(viewsets.ModelViewSet):
             url_path='shopping_cart')
     def shopping_cart(self, request, pk):
         if request.method == 'POST':
-            return self.add_to(ShoppingCartSerializer, request, pk)
+            return self.add_to(ShoppingCart, request, pk)
         return self.del_from(ShoppingCart, request, pk)
 
     @staticmethod
-    def download_shopping_list(ingredients):
-        shopping_list = 'Нужно купить:'
-        for ingredient in ingredients:
-            shopping_list += (
-                f'\n{ingredient["ingredient__name"]} '
-                f'({ingredient["ingredient__measurement_unit"]}) - '
-                f'{ingredient["amount"]}'
+    def bulk_change(model, request):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            return Response(
+                {'added': add_links(model, request.user, recipe_ids)},
+                status=status.HTTP_201_CREATED
             )
-        filename = 'shopping_list.txt'
-        response = HttpResponse(shopping_list, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename = {filename}'
+        return Response(
+            {'removed': remove_links(model, request.user, recipe_ids)})
+
+    @action(detail=False, methods=['post', 'delete'],
+            permission_classes=[IsAuthenticated],
+            url_path='favorite')
+    def bulk_favorites(self, request):
+        return self.bulk_change(Favorite, request)
+
+    @action(detail=False, methods=['post', 'delete'],
+            permission_classes=[IsAuthenticated],
+            url_path='shopping_cart')
+    def bulk_shopping_cart(self, request):
+        return self.bulk_change(ShoppingCart, request)
+
+    @action(detail=False, methods=['delete'],
+            permission_classes=[IsAuthenticated],
+            url_path='shopping_cart/clear')
+    def clear_shopping_cart(self, request):
+        remove_links(ShoppingCart, request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @staticmethod
+    def download_shopping_list(ingredients, renderer):
+        filename = f'shopping_list.{renderer.format}'
+        response = StreamingHttpResponse(
+            EXPORTERS[renderer.format](ingredients),
+            content_type=renderer.media_type
+        )
+        response['Content-Disposition'] = f'attachment; filename={filename}'
         return response
 
     @action(detail=False, methods=['get'],
             permission_classes=[IsAuthenticated],
+            renderer_classes=SHOPPING_LIST_RENDERERS,
             url_path='download_shopping_cart')
     def make_shopping_list(self, request):
-        ingredients = IngredientRecipe.objects.filter(
-            recipe__shopping_cart__user=request.user
+        ingredients = ShoppingCartIngredient.objects.filter(
+            user=request.user
         ).order_by('ingredient__name').values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-        return self.download_shopping_list(ingredients)
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        )
+        return self.download_shopping_list(
+            ingredients.iterator(), request.accepted_renderer)
 
 
 class UserViewSet(CustomUserView):
@@ -120,6 +279,11 @@ class UserViewSet(CustomUserView):
     filter_backends = (filters.SearchFilter,)
     search_fields = ('username',)
     http_method_names = ['patch', 'get', 'post', 'delete']
+    lookup_value_regex = r'\d+'
+
+    def get_queryset(self):
+        return super().get_queryset().annotate(
+            is_subscribed=subscribed_to(self.request.user))
 
     @action(detail=False, methods=['get', 'patch'],
             permission_classes=[IsAuthenticated], url_path='me')
@@ -137,34 +301,53 @@ class UserViewSet(CustomUserView):
             permission_classes=[IsAuthenticated],
             url_path='subscribe')
     def follow(self, request, id=None):
-        author = get_object_or_404(User, id=id)
-        follow_data = {
-            'user': request.user.id,
-            'author': author.id
-        }
         if request.method == 'POST':
-            serializer = FollowSerializer(author,
-                                          data=follow_data,
-                                          context={'request': request})
-            serializer.is_valid(raise_exception=True)
-            user = serializer.validated_data.get('user')
-            author = serializer.validated_data.get('author')
-            Follow.objects.create(user=user, author=author)
+            if int(id) == request.user.id:
+                raise ValidationError(
+                    {'errors': 'Нельзя подписываться на себя'})
+            added = add_links(Follow, request.user, [int(id)])
+            author = get_object_or_404(User, id=id)
+            if not added:
+                raise ValidationError({'errors': ALREADY_ADDED[Follow]})
+            forget_user(author.id)
+            author.is_subscribed = True
+            serializer = FollowListSerializer(author,
+                                              context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        get_object_or_404(
-            Follow,
-            user=request.user,
-            author=author
-        ).delete()
+        if not remove_links(Follow, request.user, [int(id)]):
+            raise Http404
+        forget_user(int(id))
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, methods=['get'],
             permission_classes=[IsAuthenticated],
             url_path='subscriptions')
     def follow_list(self, request):
-        queryset = User.objects.filter(following__user=request.user)
+        limit = FollowListSerializer.get_recipes_limit(request)
+        recipes = Recipe.objects.all()
+        if limit is not None:
+            recipes = recipes.filter(pk__in=Subquery(Recipe.objects.filter(
+                author=OuterRef('author')).values('pk')[:limit]))
+        queryset = User.objects.filter(
+            following__user=request.user
+        ).annotate(
+            is_subscribed=Value(True)
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='recent_recipes')
+        ).order_by('username')
         pages = self.paginate_queryset(queryset)
         serializer = FollowListSerializer(
             pages, many=True, context={'request': request}
         )
         return self.get_paginated_response(serializer.data)
+
+
+class MetricsView(APIView):
+    """Метрики запросов в текстовом формате Prometheus."""
+    # Сессия - чтобы метрики открывались из браузера, вошедшего в админку.
+    authentication_classes = (CachedTokenAuthentication,
+                              SessionAuthentication)
+    permission_classes = (IsAdminOrMetricsToken,)
+
+    def get(self, request):
+        return HttpResponse(export(), content_type=CONTENT_TYPE_LATEST)
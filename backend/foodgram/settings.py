@@ -32,12 +32,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -78,10 +81,45 @@ else:
             'USER': os.getenv('POSTGRES_USER', default='postgres'),
             'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
             'HOST': os.getenv('DB_HOST', default='db'),
-            'PORT': os.getenv('DB_PORT', default='5432')
+            'PORT': os.getenv('DB_PORT', default='5432'),
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
         }
     }
 
+LOCMEM_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+FILE_CACHE = 'django.core.cache.backends.filebased.FileBasedCache'
+# По умолчанию кэш в памяти воркера: FileBasedCache на каждый set()
+# перечисляет весь каталог кэша. Несколько хостов должны указать общий
+# кэш (например, PyMemcacheCache) в CACHE_BACKEND и CACHE_LOCATION.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', default=LOCMEM_CACHE)
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', default='')
+
+# Версии таблиц живут в отдельном общем для воркеров кэше, который
+# никогда не вытесняет записи: потеря версии сбрасывает ETag и кэши во
+# всех воркерах. Записей в нём по одной на таблицу, так что перебор
+# каталога в FileBasedCache здесь дешёвый.
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES',
+                                         default=10000)),
+        },
+    },
+    'versions': {
+        'BACKEND': os.getenv('VERSION_CACHE_BACKEND', default=FILE_CACHE),
+        'LOCATION': os.getenv(
+            'VERSION_CACHE_LOCATION',
+            default=os.path.join(BASE_DIR, 'cache', 'versions')
+        ),
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10 ** 9,
+        },
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': ('django.contrib.auth.password_validation.'
@@ -128,7 +166,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'
@@ -160,3 +198,49 @@ CORS_ALLOWED_ORIGINS = ['http://127.0.0.1:3000', ]
 EMAIL_LENGTH = 254
 NAME_LENGTH = 150
 CHAR_LENGTH = 200
+INGREDIENT_SEARCH_LIMIT = 20
+RECIPE_CACHE_TIMEOUT = 60 * 60 * 24
+ANONYMOUS_FEED_TIMEOUT = 60
+BULK_RECIPES_LIMIT = 100
+TOKEN_CACHE_LOCAL_TTL = 10
+# Из кэша в памяти воркера токен, сброшенный при выходе в другом воркере,
+# не удалится, поэтому живёт там не дольше локального LRU.
+TOKEN_CACHE_TTL = (TOKEN_CACHE_LOCAL_TTL if CACHE_BACKEND == LOCMEM_CACHE
+                   else 60 * 5)
+TOKEN_CACHE_SIZE = 1024
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', default=200))
+SLOW_QUERY_ANALYZE = os.getenv('SLOW_QUERY_ANALYZE', default=False) == 'True'
+SLOW_QUERY_STACK_RATE = 0.1
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG',
+                           default=os.path.join(BASE_DIR, 'slow_queries.log'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        # В журнал пишут несколько процессов gunicorn, а RotatingFileHandler
+        # ротирует файл в каждом из них отдельно и теряет записи. Файл
+        # ротируется снаружи (logrotate), WatchedFileHandler переоткрывает
+        # его после переименования.
+        'slow_queries': {
+            'class': 'logging.handlers.WatchedFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'formatter': 'message',
+            'encoding': 'utf-8',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'foodgram.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,19 @@
+import os
+
+from prometheus_client import multiprocess
+
+bind = '0:8000'
+# Пока поток ждёт ответа Postgres, остальные потоки воркера обслуживают
+# другие запросы; асинхронного ORM в Django 3.2 нет.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+# Каждый поток держит своё постоянное соединение с базой (CONN_MAX_AGE),
+# поэтому workers * threads на всех контейнерах должно оставаться ниже
+# max_connections Postgres (100 по умолчанию) с запасом на миграции,
+# админку и команды. Число воркеров не выводится из числа ядер.
+workers = int(os.getenv('GUNICORN_WORKERS', 3))
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+
+def child_exit(server, worker):
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.contrib.admin import display
+from django.db.models import Prefetch
 from django.utils.safestring import mark_safe
 
 from .models import (Favorite, Ingredient, IngredientRecipe, Recipe,
@@ -10,10 +11,18 @@ class TagInLine(admin.TabularInline):
     model = Recipe.tags.through
     min_num = 1
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('tag', 'recipe')
+
 
 class IngredientInLine(admin.TabularInline):
     model = Recipe.ingredients.through
     min_num = 1
+    autocomplete_fields = ('ingredient',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('ingredient',
+                                                            'recipe')
 
 
 @admin.register(Recipe)
@@ -22,12 +31,22 @@ class RecipeAdmin(admin.ModelAdmin):
                     'list_of_ingredients', 'list_of_tags', 'image')
     readonly_fields = ('added_in_favorites', 'list_of_ingredients',
                        'list_of_tags', 'image')
-    list_filter = ('author', 'name', 'tags',)
+    list_filter = ('tags',)
+    list_select_related = ('author',)
+    search_fields = ('name', 'author__username', 'author__email')
+    autocomplete_fields = ('author',)
+    show_full_result_count = False
     inlines = (TagInLine, IngredientInLine,)
 
-    @display(description='Частота в избранном')
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            'tags', Prefetch('ingredients',
+                             queryset=Ingredient.objects.only('name'))
+        )
+
+    @display(description='Частота в избранном', ordering='favorites_count')
     def added_in_favorites(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
     @display(description='Ингредиенты')
     def list_of_ingredients(self, obj):
@@ -43,7 +62,7 @@ class RecipeAdmin(admin.ModelAdmin):
 
     @display(description='Изображение')
     def image(self, obj):
-        if obj.image.exists():
+        if obj.image:
             return mark_safe(f'<img src={obj.image.url} '
                              f'width="80" height="60">')
         return None
@@ -52,7 +71,7 @@ class RecipeAdmin(admin.ModelAdmin):
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit',)
-    list_filter = ('name',)
+    search_fields = ('name',)
 
 
 @admin.register(Tag)
@@ -63,13 +82,34 @@ class TagAdmin(admin.ModelAdmin):
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe',)
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
 
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe',)
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
 
 
 @admin.register(IngredientRecipe)
 class IngredientRecipeAdmin(admin.ModelAdmin):
     list_display = ('recipe', 'ingredient', 'amount',)
+    list_select_related = ('recipe', 'ingredient')
+    autocomplete_fields = ('recipe', 'ingredient')
+
+    # Здесь состав меняется без сохранения рецепта, поэтому кэш рецепта
+    # сбрасывается явно.
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        Recipe.touch({obj.recipe_id, form.initial.get('recipe')} - {None})
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        Recipe.touch([obj.recipe_id])
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = set(queryset.values_list('recipe_id', flat=True))
+        super().delete_queryset(request, queryset)
+        Recipe.touch(recipe_ids)
@@ -0,0 +1,81 @@
+from django.db import connection, transaction
+
+from .counters import COUNTERS, shift_counters
+from .models import ShoppingCart, ShoppingCartIngredient
+from .versions import bump_version
+
+
+def bookkeep(model, user, target_ids, delta):
+    """То, что при поштучных изменениях через ORM делают сигналы."""
+    shift_counters(model, target_ids, delta)
+    bump_version(model)
+    if model is ShoppingCart:
+        ShoppingCartIngredient.apply((user.pk,), {
+            ingredient_id: amount * delta for ingredient_id, amount
+            in ShoppingCartIngredient.recipes_amounts(target_ids).items()
+        })
+
+
+def returned_ids(sql, params, target_ids=None):
+    """Выполняет запрос с RETURNING, id возвращаются в порядке target_ids."""
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        returned = {row[0] for row in cursor.fetchall()}
+    if target_ids is None:
+        return sorted(returned)
+    return [target_id for target_id in target_ids if target_id in returned]
+
+
+@transaction.atomic
+def add_links(model, user, target_ids):
+    """Связывает пользователя с рецептами или авторами одним INSERT.
+
+    Уже существующие связи пропускаются через ON CONFLICT DO NOTHING,
+    несуществующие цели - через SELECT из их таблицы, поэтому
+    параллельные запросы не упираются в ограничения уникальности.
+    Возвращает id целей, для которых связь действительно добавлена.
+    """
+    target_ids = list(dict.fromkeys(target_ids))
+    field = model._meta.get_field(COUNTERS[model][0])
+    user_column = model._meta.get_field('user').column
+    target_meta = field.related_model._meta
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    added = returned_ids(
+        f'INSERT INTO {quote(model._meta.db_table)} '
+        f'({quote(user_column)}, {quote(field.column)}) '
+        f'SELECT %s, {quote(target_meta.pk.column)} '
+        f'FROM {quote(target_meta.db_table)} '
+        f'WHERE {quote(target_meta.pk.column)} IN ({placeholders}) '
+        f'ON CONFLICT DO NOTHING RETURNING {quote(field.column)}',
+        [user.pk, *target_ids], target_ids
+    )
+    if added:
+        bookkeep(model, user, added, 1)
+    return added
+
+
+@transaction.atomic
+def remove_links(model, user, target_ids=None):
+    """Убирает связи (или все, если target_ids не задан) одним DELETE.
+
+    Возвращает id целей, связи с которыми действительно удалены.
+    """
+    field = model._meta.get_field(COUNTERS[model][0])
+    user_column = model._meta.get_field('user').column
+    quote = connection.ops.quote_name
+    sql = (f'DELETE FROM {quote(model._meta.db_table)} '
+           f'WHERE {quote(user_column)} = %s')
+    params = [user.pk]
+    if target_ids is not None:
+        target_ids = list(dict.fromkeys(target_ids))
+        sql += (f' AND {quote(field.column)} IN '
+                f'({", ".join(["%s"] * len(target_ids))})')
+        params.extend(target_ids)
+    # Строки не выбираются ради сигналов post_delete: счётчики и версии
+    # обновляются в bookkeep по тому, что вернул сам DELETE.
+    removed = returned_ids(
+        f'{sql} RETURNING {quote(field.column)}', params, target_ids)
+    if removed:
+        bookkeep(model, user, removed, -1)
+    return removed
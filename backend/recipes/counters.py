@@ -0,0 +1,50 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from users.models import Follow, User
+
+from .models import Favorite, Recipe, ShoppingCart
+
+# Модель-источник: (поле внешнего ключа, модель со счётчиком, счётчик).
+COUNTERS = {
+    Favorite: ('recipe', Recipe, 'favorites_count'),
+    ShoppingCart: ('recipe', Recipe, 'in_carts_count'),
+    Recipe: ('author', User, 'recipes_count'),
+    Follow: ('author', User, 'followers_count'),
+}
+
+
+def change_counter(instance, delta):
+    """Атомарно сдвигает счётчик, связанный с instance, на delta."""
+    fk = COUNTERS[type(instance)][0]
+    shift_counters(type(instance), [getattr(instance, f'{fk}_id')], delta)
+
+
+def shift_counters(source, target_ids, delta):
+    """Сдвигает счётчики нескольких объектов одним UPDATE."""
+    _, model, field = COUNTERS[source]
+    model.objects.filter(pk__in=target_ids).update(
+        **{field: Greatest(F(field) + delta, 0)})
+
+
+def actual_count(source):
+    fk = COUNTERS[source][0]
+    return Coalesce(Subquery(
+        source.objects.filter(**{fk: OuterRef('pk')}).order_by().values(
+            fk).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def drifted(source):
+    """Объекты, у которых счётчик разошёлся с реальным числом записей."""
+    _, model, field = COUNTERS[source]
+    return model.objects.annotate(
+        actual=actual_count(source)
+    ).exclude(**{field: F('actual')})
+
+
+def reconcile(source):
+    """Пересчитывает разошедшиеся счётчики, возвращает их количество."""
+    _, model, field = COUNTERS[source]
+    return model.objects.filter(
+        pk__in=drifted(source).values('pk')
+    ).update(**{field: actual_count(source)})
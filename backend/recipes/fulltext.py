@@ -0,0 +1,81 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'recipes_recipe_fts'
+RUSSIAN_ENDINGS = sorted((
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'иях', 'ах',
+    'ях', 'ов', 'ев', 'ей', 'ой', 'ый', 'ий', 'ая', 'яя', 'ое', 'ее',
+    'ые', 'ие', 'ом', 'ем', 'ам', 'ям', 'ую', 'юю', 'а', 'я', 'о', 'е',
+    'ы', 'и', 'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+
+
+def stem(word):
+    """Грубое отсечение окончания для префиксного поиска в FTS5."""
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+def fts_query(value):
+    words = re.findall(r'\w+', value.lower())
+    return ' '.join(f'"{stem(word)}"*' for word in words)
+
+
+def search_recipes(queryset, value):
+    """Отбирает рецепты по названию и описанию, лучшие - первыми."""
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(value, config='russian',
+                            search_type='websearch')
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-created')
+    if connection.vendor == 'sqlite':
+        match = fts_query(value)
+        if not match:
+            return queryset.none()
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (match,)
+        )).annotate(rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s '
+            f'AND {FTS_TABLE}.rowid = recipes_recipe.id',
+            (match,), output_field=FloatField()
+        )).order_by('-rank', '-created')
+    return queryset.filter(Q(name__icontains=value)
+                           | Q(text__icontains=value))
+
+
+def index_recipe(recipe):
+    """Обновляет строку рецепта в таблице FTS5 (только для SQLite)."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                       (recipe.pk,))
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+            'VALUES (%s, %s, %s)', (recipe.pk, recipe.name, recipe.text))
+
+
+def unindex_recipe(recipe):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                       (recipe.pk,))
+
+
+def rebuild_index():
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+                       'SELECT id, name, text FROM recipes_recipe')
@@ -1,32 +1,115 @@
 import csv
+import json
 import os.path
+from itertools import islice
 
 from django.conf import settings
 from django.core.management import BaseCommand
+from django.db import connection
+from recipes.bulk import returned_ids
 from recipes.models import Ingredient, Tag
+from recipes.versions import bump_version
+
+INGREDIENT_FIELDS = ('name', 'measurement_unit')
+TAG_FIELDS = ('name', 'color', 'slug')
+
+
+def read_rows(file_path, fields):
+    """Построчно читает csv-файл или список объектов из json-файла."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        if file_path.endswith('.json'):
+            for item in json.load(f):
+                yield tuple(item[field] for field in fields)
+        else:
+            for row in csv.reader(f):
+                if row:
+                    yield tuple(row)
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def insert_rows(model, fields, rows):
+    """Вставляет строки одним INSERT, возвращает число вставленных.
+
+    ON CONFLICT DO NOTHING пропускает строки, которые нарушают
+    уникальность любого поля (например, тот же slug с другим названием),
+    а RETURNING отдаёт id только действительно вставленных.
+    """
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(field).column)
+                        for field in fields)
+    values = ', '.join(['({})'.format(', '.join(['%s'] * len(fields)))]
+                       * len(rows))
+    return len(returned_ids(
+        f'INSERT INTO {quote(model._meta.db_table)} ({columns}) '
+        f'VALUES {values} ON CONFLICT DO NOTHING '
+        f'RETURNING {quote(model._meta.pk.column)}',
+        [value for row in rows for value in row]
+    ))
 
 
 class Command(BaseCommand):
-    help = "Loads data from csv files"
+    help = "Loads data from csv or json files"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ingredients',
+            default=os.path.join(settings.DATA_ROOT, 'ingredients.csv'),
+            help='Path to ingredients .csv or .json file'
+        )
+        parser.add_argument(
+            '--tags',
+            default=os.path.join(settings.DATA_ROOT, 'tags.csv'),
+            help='Path to tags .csv or .json file'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only print rows that are missing in the database'
+        )
 
     def handle(self, *args, **options):
         print('Trying to load ingredients data')
-        file_path = os.path.join(settings.DATA_ROOT, 'ingredients.csv')
-        with open(file_path, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            for name, unit in reader:
-                Ingredient.objects.get_or_create(
-                    name=name,
-                    measurement_unit=unit
-                )
-            print('Ingredients data successfully uploaded')
+        self.load(Ingredient, INGREDIENT_FIELDS, 'name',
+                  options['ingredients'], options)
         print('Trying to load tags data')
-        file_path = os.path.join(settings.DATA_ROOT, 'tags.csv')
-        with open(file_path, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            for tag, color, slug in reader:
-                Tag.objects.get_or_create(
-                    name=tag, color=color,
-                    slug=slug
-                )
-            print('Tags data successfully uploaded')
+        self.load(Tag, TAG_FIELDS, 'slug', options['tags'], options)
+
+    @staticmethod
+    def load(model, fields, lookup, file_path, options):
+        """Вставляет пачками строки, которых ещё нет в базе."""
+        key_index = fields.index(lookup)
+        inserted = skipped = 0
+        seen = set()
+        for batch in batches(read_rows(file_path, fields),
+                             options['batch_size']):
+            existing = set(model.objects.filter(**{
+                f'{lookup}__in': {row[key_index] for row in batch}
+            }).values_list(*fields))
+            new_rows = []
+            for row in batch:
+                if row in existing or row in seen:
+                    skipped += 1
+                    continue
+                seen.add(row)
+                new_rows.append(row)
+                if options['dry_run']:
+                    print('+ ' + ', '.join(row))
+            if options['dry_run']:
+                inserted += len(new_rows)
+                continue
+            created = insert_rows(model, fields, new_rows) if new_rows else 0
+            inserted += created
+            skipped += len(new_rows) - created
+        if inserted and not options['dry_run']:
+            bump_version(model)
+        action = 'to insert' if options['dry_run'] else 'inserted'
+        print(f'{model._meta.verbose_name_plural}: {inserted} rows '
+              f'{action}, {skipped} rows skipped')
@@ -0,0 +1,56 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from recipes.models import ShoppingCartIngredient
+
+
+class Command(BaseCommand):
+    help = "Rebuilds or verifies the per-user shopping list table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Only report rows that differ from the shopping carts'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            self.verify()
+        else:
+            self.rebuild(options['batch_size'])
+
+    def verify(self):
+        expected = {
+            (user_id, ingredient_id): total for user_id, ingredient_id, total
+            in ShoppingCartIngredient.expected_amounts().iterator()
+        }
+        actual = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingCartIngredient.objects.values_list(
+                'user_id', 'ingredient_id', 'amount').iterator()
+        }
+        mismatches = [key for key in {*expected, *actual}
+                      if expected.get(key) != actual.get(key)]
+        for user_id, ingredient_id in sorted(mismatches)[:20]:
+            print(f'user {user_id}, ingredient {ingredient_id}: '
+                  f'expected {expected.get((user_id, ingredient_id))}, '
+                  f'stored {actual.get((user_id, ingredient_id))}')
+        print(f'{len(mismatches)} mismatched rows')
+
+    @transaction.atomic
+    def rebuild(self, batch_size):
+        deleted, _ = ShoppingCartIngredient.objects.all().delete()
+        created = 0
+        batch = []
+        for user_id, ingredient_id, total in (
+                ShoppingCartIngredient.expected_amounts().iterator()):
+            batch.append(ShoppingCartIngredient(
+                user_id=user_id, ingredient_id=ingredient_id, amount=total))
+            if len(batch) == batch_size:
+                created += len(ShoppingCartIngredient.objects.bulk_create(
+                    batch))
+                batch = []
+        created += len(ShoppingCartIngredient.objects.bulk_create(batch))
+        print(f'Shopping lists rebuilt: {deleted} rows removed, '
+              f'{created} rows created')
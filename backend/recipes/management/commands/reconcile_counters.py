@@ -0,0 +1,22 @@
+from django.core.management import BaseCommand
+from recipes.counters import COUNTERS, drifted, reconcile
+
+
+class Command(BaseCommand):
+    help = "Recalculates denormalized counters that drifted from the data"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Only report counters that differ from the data'
+        )
+
+    def handle(self, *args, **options):
+        for source, (_, model, field) in COUNTERS.items():
+            name = f'{model._meta.model_name}.{field}'
+            if options['verify']:
+                for obj in drifted(source):
+                    print(f'{name} pk={obj.pk}: '
+                          f'{getattr(obj, field)} != {obj.actual}')
+            else:
+                print(f'{name}: {reconcile(source)} rows fixed')
@@ -0,0 +1,172 @@
+import random
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, call_command
+from django.db.models import Max
+from recipes import fulltext
+from recipes.management.commands.import_csv import batches
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart, ShoppingCartIngredient, Tag,
+                            TagRecipe)
+from recipes.versions import bump_version
+from users.models import Follow, User
+
+AMOUNTS = (1, 2, 3, 5, 10, 50, 100, 150, 200, 250, 300, 500, 1000)
+
+
+def weighted(rng, population, weights, k):
+    """Выбирает k различных элементов с учётом весов."""
+    k = min(k, len(population))
+    chosen = set()
+    while len(chosen) < k:
+        chosen.update(rng.choices(population, cum_weights=weights,
+                                  k=k - len(chosen)))
+    return sorted(chosen)
+
+
+def cumulative(weights):
+    total = 0
+    result = []
+    for weight in weights:
+        total += weight
+        result.append(total)
+    return result
+
+
+def insert(model, objects, batch_size):
+    """Вставляет объекты пачками и возвращает первичные ключи новых строк.
+
+    bulk_create не возвращает ключи на SQLite, поэтому они выбираются
+    после вставки; команда рассчитана на базу без параллельной записи.
+    """
+    last_pk = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    for batch in batches(objects, batch_size):
+        model.objects.bulk_create(batch, ignore_conflicts=True)
+    return list(model.objects.filter(pk__gt=last_pk).order_by(
+        'pk').values_list('pk', flat=True))
+
+
+class Command(BaseCommand):
+    help = ("Generates users, follows, recipes, favorites and shopping carts "
+            "for load testing")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Random seed for reproducible data')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        if not (Ingredient.objects.exists() and Tag.objects.exists()):
+            call_command('import_csv')
+        ingredients = list(Ingredient.objects.values_list('pk', 'name'))
+        tags = list(Tag.objects.values_list('pk', flat=True))
+        # Популярность ингредиентов распределена по закону Ципфа.
+        rng.shuffle(ingredients)
+        ingredient_weights = cumulative(
+            1 / rank for rank in range(1, len(ingredients) + 1))
+
+        user_ids = self.create_users(options['users'], batch_size)
+        # Активность авторов и популярность рецептов - распределение Парето.
+        author_weights = cumulative(rng.paretovariate(1.2) for _ in user_ids)
+        recipe_ids = self.create_recipes(
+            rng, options['recipes'], batch_size, user_ids, author_weights,
+            ingredients, ingredient_weights, tags)
+        recipe_weights = cumulative(
+            rng.paretovariate(1.1) for _ in recipe_ids)
+
+        created = {}
+        for model, field, targets, weights, counter in (
+                (Follow, 'author_id', user_ids, author_weights,
+                 self.follow_count),
+                (Favorite, 'recipe_id', recipe_ids, recipe_weights,
+                 self.favorite_count),
+                (ShoppingCart, 'recipe_id', recipe_ids, recipe_weights,
+                 self.cart_count)):
+            created[model] = len(insert(model, (
+                model(user_id=user_id, **{field: target})
+                for user_id in user_ids
+                for target in weighted(rng, targets, weights, counter(rng))
+                if model is not Follow or target != user_id
+            ), batch_size))
+
+        self.rebuild_derived_data()
+        print(f'Created {len(user_ids)} users, {len(recipe_ids)} recipes, '
+              f'{created[Follow]} follows, {created[Favorite]} favorites, '
+              f'{created[ShoppingCart]} shopping cart entries')
+
+    @staticmethod
+    def follow_count(rng):
+        return min(int(rng.paretovariate(1.3)) - 1, 100)
+
+    @staticmethod
+    def favorite_count(rng):
+        return min(int(rng.expovariate(1 / 8)), 200)
+
+    @staticmethod
+    def cart_count(rng):
+        return rng.choice((0, 0, 0, 1, 2, 3, 5, 8))
+
+    @staticmethod
+    def create_users(count, batch_size):
+        offset = User.objects.aggregate(last=Max('pk'))['last'] or 0
+        password = make_password('seed_load')
+        return insert(User, (
+            User(email=f'seed{number}@example.com',
+                 username=f'seed{number}', first_name='Пользователь',
+                 last_name=str(number), password=password)
+            for number in range(offset + 1, offset + count + 1)
+        ), batch_size)
+
+    @staticmethod
+    def create_recipes(rng, count, batch_size, user_ids, author_weights,
+                       ingredients, ingredient_weights, tags):
+        recipe_ids = []
+        tags_limit = min(3, len(tags))
+        for batch in batches(range(count), batch_size):
+            compositions = [
+                weighted(rng, ingredients, ingredient_weights,
+                         rng.randint(3, 12))
+                for _ in batch
+            ]
+            ids = insert(Recipe, (
+                Recipe(
+                    author_id=rng.choices(user_ids,
+                                          cum_weights=author_weights)[0],
+                    name=' и '.join(name for _, name in composition[:2]
+                                    ).capitalize()[:settings.CHAR_LENGTH],
+                    text=', '.join(name for _, name in composition),
+                    image='recipes/images/seed_load.jpg',
+                    cooking_time=min(int(rng.lognormvariate(3.4, 0.6)) + 1,
+                                     32767)
+                ) for composition in compositions
+            ), batch_size)
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(recipe_id=recipe_id,
+                                 ingredient_id=ingredient_id,
+                                 amount=rng.choice(AMOUNTS))
+                for recipe_id, composition in zip(ids, compositions)
+                for ingredient_id, _ in composition
+            )
+            TagRecipe.objects.bulk_create(
+                TagRecipe(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in ids
+                for tag_id in rng.sample(tags, rng.randint(1, tags_limit))
+            )
+            recipe_ids.extend(ids)
+        return recipe_ids
+
+    @staticmethod
+    def rebuild_derived_data():
+        """bulk_create не шлёт сигналы, поэтому производные данные
+        пересчитываются целиком."""
+        call_command('rebuild_shopping_lists')
+        call_command('reconcile_counters')
+        fulltext.rebuild_index()
+        for model in (User, Follow, Recipe, Favorite, ShoppingCart,
+                      ShoppingCartIngredient):
+            bump_version(model)
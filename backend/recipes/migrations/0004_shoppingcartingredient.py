@@ -0,0 +1,55 @@
+# Generated by Django 3.2 on 2026-10-18 06:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+def fill_shopping_lists(apps, schema_editor):
+    IngredientRecipe = apps.get_model('recipes', 'IngredientRecipe')
+    ShoppingCartIngredient = apps.get_model('recipes',
+                                            'ShoppingCartIngredient')
+    ShoppingCartIngredient.objects.bulk_create(
+        ShoppingCartIngredient(user_id=user_id, ingredient_id=ingredient_id,
+                               amount=total)
+        for user_id, ingredient_id, total in IngredientRecipe.objects.filter(
+            recipe__shopping_cart__isnull=False, ingredient__isnull=False
+        ).values_list(
+            'recipe__shopping_cart__user_id', 'ingredient_id'
+        ).annotate(total=Sum('amount')).order_by().iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0003_alter_recipe_options'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='author',
+            field=models.ForeignKey(default='Автор неизвестен', null=True, on_delete=django.db.models.deletion.SET_DEFAULT, related_name='recipes', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
+        ),
+        migrations.CreateModel(
+            name='ShoppingCartIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(verbose_name='Кол-во ингредиента')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент списка покупок',
+                'verbose_name_plural': 'Ингредиенты списка покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcartingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_ingredient_in_shopping_list'),
+        ),
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
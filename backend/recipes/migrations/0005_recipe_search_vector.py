@@ -0,0 +1,72 @@
+# Generated by Django 3.2 on 2026-10-18 06:16
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+POSTGRES_FORWARD = (
+    """
+    CREATE FUNCTION recipes_recipe_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('pg_catalog.russian',
+                                  coalesce(NEW.name, '')), 'A')
+            || setweight(to_tsvector('pg_catalog.russian',
+                                     coalesce(NEW.text, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER recipes_recipe_search_vector_trigger
+    BEFORE INSERT OR UPDATE ON recipes_recipe
+    FOR EACH ROW EXECUTE PROCEDURE recipes_recipe_search_vector_update();
+    """,
+    'UPDATE recipes_recipe SET search_vector = NULL;',
+    'CREATE INDEX recipes_recipe_search_vector_gin '
+    'ON recipes_recipe USING gin (search_vector);',
+)
+POSTGRES_BACKWARD = (
+    'DROP INDEX IF EXISTS recipes_recipe_search_vector_gin;',
+    'DROP TRIGGER IF EXISTS recipes_recipe_search_vector_trigger '
+    'ON recipes_recipe;',
+    'DROP FUNCTION IF EXISTS recipes_recipe_search_vector_update();',
+)
+SQLITE_FORWARD = (
+    'CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5('
+    'name, text, tokenize="unicode61 remove_diacritics 2");',
+    'INSERT INTO recipes_recipe_fts (rowid, name, text) '
+    'SELECT id, name, text FROM recipes_recipe;',
+)
+SQLITE_BACKWARD = (
+    'DROP TABLE IF EXISTS recipes_recipe_fts;',
+)
+
+
+def run_for_vendor(postgres_sql, sqlite_sql):
+    def run(apps, schema_editor):
+        statements = {
+            'postgresql': postgres_sql,
+            'sqlite': sqlite_sql,
+        }.get(schema_editor.connection.vendor, ())
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_shoppingcartingredient'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(
+            run_for_vendor(POSTGRES_FORWARD, SQLITE_FORWARD),
+            run_for_vendor(POSTGRES_BACKWARD, SQLITE_BACKWARD),
+        ),
+    ]
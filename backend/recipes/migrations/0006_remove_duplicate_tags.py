@@ -0,0 +1,22 @@
+from django.db import migrations
+from django.db.models import Min
+
+
+def remove_duplicate_tags(apps, schema_editor):
+    TagRecipe = apps.get_model('recipes', 'TagRecipe')
+    first_rows = TagRecipe.objects.values('tag', 'recipe').annotate(
+        first_id=Min('id')).values('first_id')
+    TagRecipe.objects.exclude(id__in=first_rows).exclude(
+        tag=None).exclude(recipe=None).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_tags,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+from django.db import migrations, models
+from recipes.operations import AddIndexConcurrentlyIfSupported
+
+CONSTRAINT = models.UniqueConstraint(fields=('tag', 'recipe'),
+                                     name='unique_tag_in_recipe')
+
+
+def add_unique_tag_in_recipe(apps, schema_editor):
+    """На PostgreSQL индекс строится без блокировки записи, а ограничение
+    потом надевается на готовый индекс без повторной проверки таблицы."""
+    table = schema_editor.quote_name(
+        apps.get_model('recipes', 'TagRecipe')._meta.db_table)
+    name = schema_editor.quote_name(CONSTRAINT.name)
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.execute(f'CREATE UNIQUE INDEX {name} '
+                              f'ON {table} (tag_id, recipe_id)')
+        return
+    # Прерванный CREATE INDEX CONCURRENTLY оставляет невалидный индекс.
+    schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+    schema_editor.execute(f'CREATE UNIQUE INDEX CONCURRENTLY {name} '
+                          f'ON {table} (tag_id, recipe_id)')
+    schema_editor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} '
+                          f'UNIQUE USING INDEX {name}')
+
+
+def remove_unique_tag_in_recipe(apps, schema_editor):
+    table = schema_editor.quote_name(
+        apps.get_model('recipes', 'TagRecipe')._meta.db_table)
+    name = schema_editor.quote_name(CONSTRAINT.name)
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'ALTER TABLE {table} DROP CONSTRAINT {name}')
+    else:
+        schema_editor.execute(f'DROP INDEX {name}')
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0006_remove_duplicate_tags'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(add_unique_tag_in_recipe,
+                                     remove_unique_tag_in_recipe),
+            ],
+            state_operations=[
+                migrations.AddConstraint(model_name='tagrecipe',
+                                         constraint=CONSTRAINT),
+            ],
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            index=models.Index(fields=['-created', '-id'], name='recipe_created_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-created'], name='recipe_author_created_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.2 on 2026-10-18 06:18
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, fk):
+    return Coalesce(Subquery(
+        model.objects.filter(**{fk: OuterRef('pk')}).order_by().values(
+            fk).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    User = apps.get_model('users', 'User')
+    Favorite = apps.get_model('recipes', 'Favorite')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    Follow = apps.get_model('users', 'Follow')
+    Recipe.objects.update(favorites_count=count_of(Favorite, 'recipe'),
+                          in_carts_count=count_of(ShoppingCart, 'recipe'))
+    User.objects.update(recipes_count=count_of(Recipe, 'author'),
+                        followers_count=count_of(Follow, 'author'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_indexes'),
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлений в избранное'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлений в корзину'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
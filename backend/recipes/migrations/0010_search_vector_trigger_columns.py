@@ -0,0 +1,36 @@
+from django.db import migrations
+
+TRIGGER = (
+    """
+    CREATE TRIGGER recipes_recipe_search_vector_trigger
+    BEFORE {events} ON recipes_recipe
+    FOR EACH ROW EXECUTE PROCEDURE recipes_recipe_search_vector_update();
+    """
+)
+DROP_TRIGGER = ('DROP TRIGGER IF EXISTS recipes_recipe_search_vector_trigger '
+                'ON recipes_recipe;')
+
+
+def recreate_trigger(events):
+    """Вектор пересчитывается только при изменении name или text, а не
+    при каждом UPDATE счётчиков и даты изменения."""
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        schema_editor.execute(DROP_TRIGGER)
+        schema_editor.execute(TRIGGER.format(events=events))
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_updated'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            recreate_trigger('INSERT OR UPDATE OF name, text'),
+            recreate_trigger('INSERT OR UPDATE'),
+        ),
+    ]
@@ -1,8 +1,10 @@
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db import models
-from django.db.models import UniqueConstraint
-from users.models import User
+from django.db import models, transaction
+from django.db.models import Sum, UniqueConstraint
+from django.utils import timezone
+from users.models import CountersMixin, User
 
 
 class Tag(models.Model):
@@ -47,7 +49,7 @@ class Ingredient(models.Model):
         return f'{self.name}, {self.measurement_unit}'
 
 
-class Recipe(models.Model):
+class Recipe(CountersMixin, models.Model):
     tags = models.ManyToManyField(Tag, through='TagRecipe',
                                   related_name='recipes',
                                   verbose_name='Тег')
@@ -72,15 +74,39 @@ class Recipe(models.Model):
     )
     created = models.DateTimeField(verbose_name='Дата публикации',
                                    auto_now_add=True)
+    updated = models.DateTimeField(verbose_name='Дата изменения',
+                                   auto_now=True)
+    search_vector = SearchVectorField(verbose_name='Поисковый вектор',
+                                      null=True, editable=False)
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='Добавлений в избранное', default=0, editable=False)
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='Добавлений в корзину', default=0, editable=False)
+    COUNTER_FIELDS = ('favorites_count', 'in_carts_count')
 
     class Meta:
         ordering = ('-created',)
+        indexes = [
+            models.Index(fields=('-created', '-id'),
+                         name='recipe_created_idx'),
+            models.Index(fields=('author', '-created'),
+                         name='recipe_author_created_idx'),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def touch(cls, recipe_ids):
+        """Сдвигает дату изменения, по которой версионируется кэш рецептов.
+
+        save() рецепта сдвигает её сам; вызывать нужно, только когда
+        теги или ингредиенты меняются без сохранения рецепта.
+        """
+        cls.objects.filter(pk__in=recipe_ids).update(updated=timezone.now())
+
 
 class TagRecipe(models.Model):
     tag = models.ForeignKey(
@@ -97,6 +123,12 @@ class TagRecipe(models.Model):
     )
 
     class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=('tag', 'recipe'),
+                name='unique_tag_in_recipe'
+            )
+        ]
         verbose_name = 'Тег рецепта'
         verbose_name_plural = 'Теги рецепта'
 
@@ -175,3 +207,107 @@ class ShoppingCart(UserRecipeBaseModel):
         default_related_name = 'shopping_cart'
         verbose_name = 'Рецепт в корзине'
         verbose_name_plural = 'Рецепты в корзине'
+
+
+class ShoppingCartIngredient(models.Model):
+    """Суммарное кол-во ингредиента во всех рецептах корзины пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Ингредиент'
+    )
+    amount = models.PositiveIntegerField(verbose_name='Кол-во ингредиента')
+
+    class Meta:
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списка покупок'
+        constraints = [
+            UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_ingredient_in_shopping_list'
+            )
+        ]
+
+    def __str__(self):
+        return (f'{self.user} должен купить {self.ingredient}:'
+                f' {self.amount}')
+
+    @staticmethod
+    def recipe_amounts(recipe):
+        return dict(IngredientRecipe.objects.filter(
+            recipe=recipe, ingredient__isnull=False
+        ).values_list('ingredient_id', 'amount'))
+
+    @classmethod
+    def apply(cls, user_ids, amounts):
+        """Прибавляет к спискам покупок пользователей разницу amounts.
+
+        Строки пользователей блокируются (FOR NO KEY UPDATE, в порядке id),
+        чтобы параллельные изменения одного списка не вставили одну и ту
+        же строку дважды.
+        """
+        amounts = {ingredient_id: amount for ingredient_id, amount
+                   in amounts.items() if amount}
+        user_ids = list(user_ids)
+        if not user_ids or not amounts:
+            return
+        with transaction.atomic():
+            list(User.objects.select_for_update(no_key=True).filter(
+                pk__in=user_ids).order_by('pk').values_list('pk'))
+            rows = {
+                (row.user_id, row.ingredient_id): row
+                for row in cls.objects.select_for_update().filter(
+                    user_id__in=user_ids, ingredient_id__in=amounts)
+            }
+            changed, created = [], []
+            for user_id in user_ids:
+                for ingredient_id, amount in amounts.items():
+                    row = rows.get((user_id, ingredient_id))
+                    if row is not None:
+                        row.amount = max(row.amount + amount, 0)
+                        changed.append(row)
+                    elif amount > 0:
+                        created.append(cls(user_id=user_id,
+                                           ingredient_id=ingredient_id,
+                                           amount=amount))
+            cls.objects.bulk_update(changed, ('amount',))
+            cls.objects.bulk_create(created)
+            cls.objects.filter(user_id__in=user_ids, amount=0).delete()
+
+    @staticmethod
+    def recipes_amounts(recipe_ids):
+        """Суммарные количества ингредиентов в нескольких рецептах."""
+        return dict(IngredientRecipe.objects.filter(
+            recipe_id__in=recipe_ids, ingredient__isnull=False
+        ).values_list('ingredient_id').annotate(
+            total=Sum('amount')).order_by())
+
+    @classmethod
+    def change_recipe(cls, recipe, old_amounts, new_amounts=None):
+        """Переносит изменение ингредиентов рецепта (объекта или id)
+        в корзины с ним."""
+        if new_amounts is None:
+            new_amounts = cls.recipe_amounts(recipe)
+        cls.apply(
+            ShoppingCart.objects.filter(recipe=recipe).values_list(
+                'user_id', flat=True),
+            {ingredient_id: (new_amounts.get(ingredient_id, 0)
+                             - old_amounts.get(ingredient_id, 0))
+             for ingredient_id in {*old_amounts, *new_amounts}}
+        )
+
+    @staticmethod
+    def expected_amounts():
+        """Агрегат, который должен храниться в таблице."""
+        return IngredientRecipe.objects.filter(
+            recipe__shopping_cart__isnull=False, ingredient__isnull=False
+        ).values_list(
+            'recipe__shopping_cart__user_id', 'ingredient_id'
+        ).annotate(total=Sum('amount')).order_by()
@@ -0,0 +1,24 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db.migrations import AddIndex
+
+
+class AddIndexConcurrentlyIfSupported(AddIndexConcurrently):
+    """CREATE INDEX CONCURRENTLY на PostgreSQL, обычный индекс на прочих."""
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state,
+                                      to_state)
+        else:
+            AddIndex.database_forwards(self, app_label, schema_editor,
+                                       from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state,
+                                       to_state)
+        else:
+            AddIndex.database_backwards(self, app_label, schema_editor,
+                                        from_state, to_state)
@@ -0,0 +1,128 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from users.models import Follow, User
+
+from . import fulltext
+from .counters import COUNTERS, change_counter
+from .models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                     ShoppingCart, ShoppingCartIngredient, Tag, TagRecipe)
+from .versions import bump_version
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Follow)
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Recipe)
+def table_changed(sender, **kwargs):
+    bump_version(sender)
+
+
+# Дату изменения рецепта здесь не сдвигаем: сериализатор и админка
+# сохраняют сам рецепт, и UPDATE на каждую строку состава был бы лишним.
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+@receiver((post_save, post_delete), sender=TagRecipe)
+def recipe_relation_changed(sender, **kwargs):
+    bump_version(Recipe)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    bump_version(Recipe)
+    if not reverse:
+        return
+    if pk_set:
+        Recipe.touch(pk_set)
+    else:
+        bump_version(Tag)
+
+
+@receiver((post_save, post_delete), sender=User)
+def user_changed(sender, update_fields=None, **kwargs):
+    if update_fields != frozenset(('last_login',)):
+        bump_version(sender)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    fulltext.index_recipe(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    fulltext.unindex_recipe(instance)
+
+
+# Список покупок обновляется по текущему состоянию базы. Массовые
+# операции (bulk.py, сериализатор рецепта) идут мимо сигналов и обновляют
+# список сами.
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    """Ингредиенты удаляемого рецепта отвязываются (SET_NULL) раньше, чем
+    удаляются корзины с ним, поэтому рецепт вычитается из списков здесь,
+    а удаление корзин затем вычитает уже пустой состав."""
+    ShoppingCartIngredient.change_recipe(
+        instance, ShoppingCartIngredient.recipe_amounts(instance), {})
+
+
+@receiver(post_save, sender=ShoppingCart)
+def cart_recipe_added(sender, instance, created, **kwargs):
+    if created:
+        ShoppingCartIngredient.apply(
+            (instance.user_id,),
+            ShoppingCartIngredient.recipe_amounts(instance.recipe_id))
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def cart_recipe_removed(sender, instance, **kwargs):
+    ShoppingCartIngredient.apply((instance.user_id,), {
+        ingredient_id: -amount for ingredient_id, amount
+        in ShoppingCartIngredient.recipe_amounts(instance.recipe_id).items()
+    })
+
+
+def ingredient_amounts(instance):
+    if instance.ingredient_id is None:
+        return {}
+    return {instance.ingredient_id: instance.amount}
+
+
+@receiver(pre_save, sender=IngredientRecipe)
+def recipe_ingredient_saving(sender, instance, **kwargs):
+    instance.saved_amounts = {} if instance._state.adding else dict(
+        IngredientRecipe.objects.filter(
+            pk=instance.pk, ingredient__isnull=False
+        ).values_list('ingredient_id', 'amount'))
+
+
+@receiver(post_save, sender=IngredientRecipe)
+def recipe_ingredient_saved(sender, instance, **kwargs):
+    ShoppingCartIngredient.change_recipe(
+        instance.recipe_id, instance.saved_amounts,
+        ingredient_amounts(instance))
+
+
+@receiver(post_delete, sender=IngredientRecipe)
+def recipe_ingredient_deleted(sender, instance, **kwargs):
+    ShoppingCartIngredient.change_recipe(
+        instance.recipe_id, ingredient_amounts(instance), {})
+
+
+def counted_object_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(instance, 1)
+
+
+def counted_object_deleted(sender, instance, **kwargs):
+    change_counter(instance, -1)
+
+
+# Подписка только на модели со счётчиками, чтобы удаление остальных
+# моделей оставалось быстрым, без выборки строк ради сигналов.
+for counted_model in COUNTERS:
+    post_save.connect(counted_object_created, sender=counted_model)
+    post_delete.connect(counted_object_deleted, sender=counted_model)
@@ -0,0 +1,50 @@
+import time
+from functools import wraps
+
+from django.core.cache import caches
+from django.db import transaction
+
+cache = caches['versions']
+
+
+def version_key(model):
+    return f'version:{model._meta.label_lower}'
+
+
+def get_versions(keys):
+    """Версии по ключам; версия - время последнего изменения в нс."""
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def get_version(model):
+    """Текущая версия таблицы модели, общая для всех процессов."""
+    return get_versions([version_key(model)])[0]
+
+
+def bump_version(model):
+    key = version_key(model)
+    transaction.on_commit(lambda: cache.set(key, time.time_ns(), None))
+
+
+def cached_per_version(model):
+    """Хранит результат функции в памяти процесса до смены версии model."""
+    def decorator(build):
+        memo = {}
+
+        @wraps(build)
+        def wrapper():
+            # Версия и значение хранятся одной парой, чтобы потоки воркера
+            # не увидели значение от одной версии с номером другой.
+            version = get_version(model)
+            cached_version, value = memo.get('entry', (None, None))
+            if cached_version != version:
+                value = build()
+                memo['entry'] = (version, value)
+            return value
+        return wrapper
+    return decorator
@@ -8,14 +8,17 @@ class UserAdmin(admin.ModelAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name',
                     'recipe_count', 'follows_count')
     search_fields = ('username', 'email')
-    list_filter = ('email', 'first_name', 'last_name')
+    list_filter = ('is_staff', 'is_active')
+    show_full_result_count = False
     ordering = ('username', )
     empty_value_display = '-пусто-'
 
-    @admin.display(description='Рецепты пользователя')
+    @admin.display(description='Рецепты пользователя',
+                   ordering='recipes_count')
     def recipe_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_count
 
-    @admin.display(description='Подписчики пользователя')
+    @admin.display(description='Подписчики пользователя',
+                   ordering='followers_count')
     def follows_count(self, obj):
-        return obj.following.count()
+        return obj.followers_count
@@ -3,7 +3,31 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 
-class User(AbstractUser):
+class CountersMixin:
+    """Не даёт обычному save() записать счётчики из COUNTER_FIELDS.
+
+    Счётчики сдвигаются только UPDATE с F(), а экземпляр в памяти (в том
+    числе закэшированный request.user) хранит их устаревшие значения.
+    """
+    COUNTER_FIELDS = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('force_insert'):
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                deferred = self.get_deferred_fields()
+                update_fields = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.attname not in deferred
+                ]
+            kwargs['update_fields'] = [
+                name for name in update_fields
+                if name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CountersMixin, AbstractUser):
     email = models.EmailField(verbose_name='Email',
                               max_length=settings.EMAIL_LENGTH, unique=True)
     username = models.CharField(verbose_name='Имя пользователя',
@@ -12,6 +36,11 @@ class User(AbstractUser):
                                   max_length=settings.NAME_LENGTH)
     last_name = models.CharField(verbose_name='Фамилия',
                                  max_length=settings.NAME_LENGTH)
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Рецептов', default=0, editable=False)
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Подписчиков', default=0, editable=False)
+    COUNTER_FIELDS = ('recipes_count', 'followers_count')
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')
 